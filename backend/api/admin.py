@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth import get_user_model
-from .models import FormSubmission, AIModel, ChatHistory, UserProfile
+from .models import FormSubmission, AIModel, ChatHistory, UserProfile, ConversationSummary
 
 User = get_user_model()
 
@@ -51,3 +51,10 @@ class UserProfileAdmin(admin.ModelAdmin):
     readonly_fields = ['created_at', 'updated_at']
     date_hierarchy = 'created_at'
 
+
+
+@admin.register(ConversationSummary)
+class ConversationSummaryAdmin(admin.ModelAdmin):
+    list_display = ['user', 'last_message_id', 'updated_at']
+    search_fields = ['user__email', 'summary']
+    readonly_fields = ['updated_at']
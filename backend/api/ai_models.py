@@ -0,0 +1,100 @@
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Count, Max
+
+from .models import AIModel
+
+
+def _version(marks):
+    return marks['updated_at'], marks['count']
+
+
+class AIModelSnapshot:
+    """
+    In-memory snapshot of the active AIModel rows.
+
+    The table changes rarely, so lookups are served from memory. At most
+    every `check_interval` seconds each process compares the table's newest
+    updated_at and row count, read in one aggregate query, with those of its
+    snapshot and reloads on a difference. Every save (including from
+    `manage.py update_aimodel` in another process) moves updated_at and
+    every delete the count, so no shared cache is needed. Changes made in
+    this process (post_save/post_delete) drop the snapshot right away.
+    """
+
+    def __init__(self, check_interval=1.0):
+        self.check_interval = check_interval
+        self._models = None
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _check_due(self):
+        if self._models is None:
+            return True
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return False
+        self._checked_at = now
+        return True
+
+    def _table_version(self):
+        return _version(AIModel.objects.aggregate(updated_at=Max('updated_at'), count=Count('id')))
+
+    async def _atable_version(self):
+        return _version(await AIModel.objects.aaggregate(updated_at=Max('updated_at'), count=Count('id')))
+
+    def _reload(self, version):
+        models = {model.model_name: model for model in AIModel.objects.filter(is_active=True)}
+        with self._lock:
+            self._models = models
+            self._version = version
+            self._checked_at = time.monotonic()
+        return models
+
+    # invalidate() may drop self._models from another thread at any point,
+    # so each of these reads it once and only returns what it read or loaded
+
+    def _active(self):
+        models = self._models
+        if models is None or self._check_due():
+            version = self._table_version()
+            if models is None or version != self._version:
+                models = self._reload(version)
+        return models
+
+    async def _aactive(self):
+        models = self._models
+        if models is None or self._check_due():
+            version = await self._atable_version()
+            if models is None or version != self._version:
+                models = await sync_to_async(self._reload)(version)
+        return models
+
+    def get_key(self, model_name):
+        """API key of an active model, or None"""
+        model = self._active().get(model_name)
+        return model.api_key if model else None
+
+    async def aget_key(self, model_name):
+        """Async version of get_key"""
+        model = (await self._aactive()).get(model_name)
+        return model.api_key if model else None
+
+    def active_models(self):
+        """Active AIModel rows in the table's default ordering"""
+        return sorted(self._active().values(), key=lambda model: model.model_name)
+
+    async def aactive_models(self):
+        """Async version of active_models"""
+        return sorted((await self._aactive()).values(), key=lambda model: model.model_name)
+
+    def invalidate(self):
+        """Drop the local snapshot, other processes notice the change on their next check"""
+        self._models = None
+
+
+ai_models = AIModelSnapshot(check_interval=getattr(settings, 'AIMODEL_VERSION_CHECK_INTERVAL', 1.0))
@@ -0,0 +1,212 @@
+"""
+Async versions of the LLM-bound endpoints.
+
+DRF 3.14 views are sync-only, so these are plain Django async views. Under
+ASGI a provider call no longer holds a worker thread for its whole duration,
+and one process can keep many LLM requests in flight.
+"""
+
+from functools import wraps
+from urllib.parse import urlparse
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+from rest_framework.exceptions import AuthenticationFailed
+
+from .authentication import aauthenticate
+from .conditional import ahistory_validators, not_modified, with_validators
+from .metrics import record_tokens
+from .models import ChatHistory
+from .pages import resolve_page, UnknownPage, PageHashMismatch
+from .profiles import profile_cache
+from .renderers import loads
+from .prompts import build_chat_prompt
+from .summaries import conversation_summaries
+from .writebehind import write_behind
+from .streaming import wants_stream, sse_response, achat_event_stream, ndjson_response, aanalyze_field_stream
+from .utils import aanalyze_with_llm, aget_ai_model_key, acall_llm_coalesced
+
+
+def async_api_view(methods):
+    """Method check, JWT authentication and JSON body parsing for async views"""
+    def decorator(view_func):
+        @wraps(view_func)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return JsonResponse({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+
+            try:
+                user = await aauthenticate(request)
+            except AuthenticationFailed as e:
+                return JsonResponse({'detail': str(e.detail)}, status=403)
+            if user is None:
+                return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=403)
+            request.user = user
+
+            request.data = {}
+            if request.method in ('POST', 'PUT') and request.body:
+                try:
+                    request.data = loads(request.body)
+                except ValueError:
+                    return JsonResponse({'detail': 'JSON parse error'}, status=400)
+                if not isinstance(request.data, dict):
+                    return JsonResponse({'detail': 'JSON object expected'}, status=400)
+
+            return await view_func(request, *args, **kwargs)
+
+        # Django 4.2's csrf_exempt does not preserve async views
+        wrapper.csrf_exempt = True
+        return wrapper
+    return decorator
+
+
+async def get_user_data(user):
+    """Basic user data merged with the custom profile fields"""
+    user_data = {
+        'email': user.email,
+        'name': f"{user.first_name} {user.last_name}".strip() or user.email,
+        'username': user.username,
+    }
+    user_data.update((await profile_cache.aget(user.id)).data)  # Merge custom profile fields
+    return user_data
+
+
+@async_api_view(['POST'])
+async def analyze_with_ai(request):
+    """Async version of views.analyze_with_ai"""
+    html = request.data.get('html')
+    html_hash = request.data.get('html_hash')
+    url = request.data.get('url')
+    chat_history = request.data.get('chat_history', [])
+
+    if not (html or html_hash) or not url:
+        return JsonResponse({'error': 'HTML and URL are required'}, status=400)
+
+    try:
+        # Parsing large pages is CPU-bound, keep it off the event loop
+        digest, descriptors = await sync_to_async(resolve_page, thread_sensitive=False)(html, html_hash)
+    except PageHashMismatch as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except UnknownPage as e:
+        return JsonResponse({'error': str(e), 'upload_required': True}, status=409)
+
+    model_name = request.user.preferred_ai_model or 'gemini'
+    user_data = await get_user_data(request.user)
+
+    if wants_stream(request) and model_name in ('gemini', 'groq'):
+        api_key = await aget_ai_model_key(model_name)
+        if not api_key:
+            return JsonResponse({'error': f'API key not configured for {model_name}'}, status=500)
+        return ndjson_response(aanalyze_field_stream(
+            request.user, descriptors, chat_history, user_data, model_name, api_key, url,
+            {'url': url, 'html_hash': digest},
+        ))
+
+    try:
+        result = await aanalyze_with_llm(html, chat_history, user_data, model_name, descriptors=descriptors)
+
+        website = urlparse(url).netloc
+        await write_behind.aadd(ChatHistory(
+            user=request.user,
+            role='assistant',
+            message=result.get('message', 'Analysis complete'),
+            website=website,
+            url=url,
+        ))
+
+        return JsonResponse({
+            'url': url,
+            'fields': result.get('fields', []),
+            'message': result.get('message', ''),
+            'model_used': result.get('model_used', model_name),
+            'prompt_tokens': result.get('prompt_tokens'),
+            'cached': result.get('cached', False),
+            'html_hash': digest,
+        })
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+@async_api_view(['POST', 'GET'])
+async def chat(request):
+    """Async version of views.chat"""
+    if request.method == 'GET':
+        limit = int(request.GET.get('limit', 50))
+        messages = ChatHistory.objects.filter(user=request.user)
+        validators = await ahistory_validators(request, messages, ChatHistory)
+        if validators:
+            response = not_modified(request, *validators)
+            if response is not None:
+                return response
+
+        columns = ['id', 'role', 'message', 'website', 'url', 'created_at']
+        chats = await write_behind.awith_pending(
+            ChatHistory, request.user.id,
+            messages.order_by('-created_at').values(*columns)[:limit],
+            limit=limit, fields=columns,
+        )
+        response = JsonResponse({'history': chats[::-1]})
+        return with_validators(response, *validators) if validators else response
+
+    message = request.data.get('message')
+    url = request.data.get('url', '')
+    website = urlparse(url).netloc if url else None
+
+    if not message:
+        return JsonResponse({'error': 'Message is required'}, status=400)
+
+    await write_behind.aadd(ChatHistory(
+        user=request.user,
+        role='user',
+        message=message,
+        website=website,
+        url=url if url else None,
+    ))
+
+    # Older messages reach the prompt through the rolling summary
+    summary, summarized_until = await conversation_summaries.aget(request.user.id)
+    max_turns = settings.PROMPT_BUDGETS['MAX_TURNS']
+    recent_chats = await write_behind.awith_pending(
+        ChatHistory, request.user.id,
+        ChatHistory.objects.filter(user=request.user, id__gt=summarized_until)
+        .order_by('-created_at')
+        .values('id', 'role', 'message')[:max_turns],
+        limit=max_turns, fields=['id', 'role', 'message'],
+    )
+    chat_history = recent_chats[::-1]
+
+    model_name = request.user.preferred_ai_model or 'gemini'
+    api_key = await aget_ai_model_key(model_name)
+
+    if not api_key:
+        return JsonResponse({'error': f'API key not configured for {model_name}'}, status=500)
+
+    user_data = await get_user_data(request.user)
+    prompt = build_chat_prompt(user_data, chat_history, message, summary=summary)
+
+    if wants_stream(request) and model_name in ('gemini', 'groq'):
+        return sse_response(achat_event_stream(request.user, model_name, prompt.text, api_key, website, url))
+
+    try:
+        if model_name in ('gemini', 'groq'):
+            response_text, model_used = await acall_llm_coalesced(model_name, prompt.text)
+            record_tokens(prompt.tokens, response_text)
+        else:
+            response_text, model_used = "I'm sorry, I don't understand.", model_name
+
+        await write_behind.aadd(ChatHistory(
+            user=request.user,
+            role='assistant',
+            message=response_text,
+            website=website,
+            url=url if url else None,
+        ))
+
+        return JsonResponse({
+            'message': response_text,
+            'model_used': model_used,
+            'prompt_tokens': prompt.tokens,
+        })
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
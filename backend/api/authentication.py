@@ -1,36 +1,133 @@
+import time
+
 import jwt as pyjwt
 from django.conf import settings
+from django.core.cache import cache
 from rest_framework.authentication import BaseAuthentication
 from rest_framework.exceptions import AuthenticationFailed
 from django.contrib.auth import get_user_model
 
+from .metrics import timed
+
 User = get_user_model()
 
 
+def get_bearer_token(request):
+    """Return the Bearer token from the Authorization header, if any"""
+    auth_header = request.META.get('HTTP_AUTHORIZATION', '')
+
+    if not auth_header.startswith('Bearer '):
+        return None
+
+    return auth_header.split(' ')[1]
+
+
+def decode_token(token, token_type='access'):
+    """Verify a JWT of the given type and return its payload"""
+    try:
+        payload = pyjwt.decode(
+            token,
+            settings.JWT_SECRET,
+            algorithms=['HS256'],
+            options={'require': ['exp', 'iat']},
+        )
+    except pyjwt.ExpiredSignatureError:
+        raise AuthenticationFailed('Token expired')
+    except pyjwt.InvalidTokenError:
+        raise AuthenticationFailed('Invalid token')
+
+    if not payload.get('user_id') or payload.get('type') != token_type:
+        raise AuthenticationFailed('Invalid token')
+    return payload
+
+
+def user_cache_key(user_id):
+    return f'jwt-user:{user_id}'
+
+
+def _user_cache_timeout(payload):
+    """Cached users never outlive the token that loaded them"""
+    return max(0, min(settings.JWT_USER_CACHE_TTL, payload['exp'] - int(time.time())))
+
+
+def invalidate_cached_user(user_id):
+    """Forget the cached user row, e.g. after it was saved or deleted"""
+    cache.delete(user_cache_key(user_id))
+
+
+def _check_user(user):
+    if user is None:
+        raise AuthenticationFailed('User not found')
+    if not user.is_active:
+        raise AuthenticationFailed('User inactive or deleted')
+    return user
+
+
+# Saves clear the cached user in the process that made them only (with the default
+# LocMemCache), so other processes check the row's marker once it is this old
+def _check_due(checked_at):
+    return time.time() - checked_at >= settings.JWT_USER_CHECK_INTERVAL
+
+
+def _marker(user):
+    return (user.updated_at, user.is_active)
+
+
+def _marker_query(user_id):
+    return User.objects.filter(id=user_id).values_list('updated_at', 'is_active')
+
+
+def get_token_user(payload):
+    """Return the user a verified token was issued for, from cache when possible"""
+    key = user_cache_key(payload['user_id'])
+    cached = cache.get(key)
+    if cached is not None:
+        user, checked_at = cached
+        if not _check_due(checked_at):
+            return _check_user(user)
+        if _marker(user) != _marker_query(user.pk).first():
+            cached = None
+    if cached is None:
+        user = User.objects.filter(id=payload['user_id']).first()
+    if user is not None:
+        cache.set(key, (user, time.time()), timeout=_user_cache_timeout(payload))
+    return _check_user(user)
+
+
+async def aget_token_user(payload):
+    """Async version of get_token_user"""
+    key = user_cache_key(payload['user_id'])
+    cached = await cache.aget(key)
+    if cached is not None:
+        user, checked_at = cached
+        if not _check_due(checked_at):
+            return _check_user(user)
+        if _marker(user) != await _marker_query(user.pk).afirst():
+            cached = None
+    if cached is None:
+        user = await User.objects.filter(id=payload['user_id']).afirst()
+    if user is not None:
+        await cache.aset(key, (user, time.time()), timeout=_user_cache_timeout(payload))
+    return _check_user(user)
+
+
 class JWTAuthentication(BaseAuthentication):
     def authenticate(self, request):
-        auth_header = request.META.get('HTTP_AUTHORIZATION', '')
-        
-        if not auth_header.startswith('Bearer '):
+        token = get_bearer_token(request)
+        if token is None:
             return None
-        
-        token = auth_header.split(' ')[1]
-        
-        try:
-            payload = pyjwt.decode(token, settings.JWT_SECRET, algorithms=['HS256'])
-            user_id = payload.get('user_id')
-            
-            if not user_id:
-                raise AuthenticationFailed('Invalid token')
-            
-            try:
-                user = User.objects.get(id=user_id)
-            except User.DoesNotExist:
-                raise AuthenticationFailed('User not found')
-            
-            return (user, None)
-        except pyjwt.ExpiredSignatureError:
-            raise AuthenticationFailed('Token expired')
-        except pyjwt.InvalidTokenError:
-            raise AuthenticationFailed('Invalid token')
 
+        with timed('auth'):
+            payload = decode_token(token)
+            return (get_token_user(payload), None)
+
+
+async def aauthenticate(request):
+    """Async JWT authentication for views that run outside DRF"""
+    token = get_bearer_token(request)
+    if token is None:
+        return None
+
+    with timed('auth'):
+        payload = decode_token(token)
+        return await aget_token_user(payload)
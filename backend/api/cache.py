@@ -0,0 +1,163 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+def _stable_hash(obj):
+    """Hash a JSON-serializable object independently of key order"""
+    encoded = json.dumps(obj, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def form_fingerprint(descriptors):
+    """Fingerprint the structure of a page's forms from its field descriptors"""
+    normalized = sorted(
+        _stable_hash({key: value for key, value in descriptor.items() if key != 'form'})
+        for descriptor in descriptors
+    )
+    return _stable_hash(normalized)[:32]
+
+
+def profile_version(user_data):
+    """Version stamp of the user data that goes into the prompt"""
+    return _stable_hash(user_data)[:16]
+
+
+def chat_version(chat_history):
+    """Version stamp of the chat turns the analyze prompt can include, '-' for none"""
+    max_turns = getattr(settings, 'PROMPT_BUDGETS', {}).get('MAX_TURNS', 10)
+    recent = chat_history[-max_turns:] if max_turns and chat_history else []
+    if not recent:
+        return '-'
+    return _stable_hash([[turn.get('role'), turn.get('message')] for turn in recent])[:16]
+
+
+class InProcessBackend:
+    """Thread-safe LRU cache with per-entry TTL, local to the worker process"""
+
+    def __init__(self, max_entries=1024, ttl=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DjangoCacheBackend:
+    """Backend on top of the Django cache framework, shared between processes"""
+
+    def __init__(self, alias='default', ttl=3600, prefix='fillora'):
+        self.cache = caches[alias]
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def _key(self, key):
+        return f'{self.prefix}:{key}'
+
+    def get(self, key):
+        return self.cache.get(self._key(key))
+
+    def set(self, key, value):
+        self.cache.set(self._key(key), value, timeout=self.ttl)
+
+    def delete(self, key):
+        self.cache.delete(self._key(key))
+
+    def clear(self):
+        # Only entries with our prefix should go, and the Django cache API
+        # cannot enumerate keys, so clearing is left to expiry.
+        pass
+
+
+BACKENDS = {
+    'inprocess': InProcessBackend,
+    'django': DjangoCacheBackend,
+}
+
+
+class AnalysisCache:
+    """Cache of parsed analyze results keyed by form fingerprint, profile and chat versions"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(fingerprint, profile_stamp, model_name, chat_stamp='-'):
+        return f'analyze:{model_name}:{fingerprint}:{profile_stamp}:{chat_stamp}'
+
+    def get(self, key):
+        value = self.backend.get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self.backend.set(key, value)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+
+def build_backend(config):
+    """Instantiate a cache backend from a settings dictionary"""
+    options = dict(config)
+    backend_name = options.pop('BACKEND', 'inprocess')
+    try:
+        backend_class = BACKENDS[backend_name]
+    except KeyError:
+        raise ValueError(f"Unknown cache backend: {backend_name}")
+    kwargs = {key.lower(): value for key, value in options.items()}
+    return backend_class(**kwargs)
+
+
+analysis_cache = AnalysisCache(build_backend(getattr(settings, 'ANALYZE_CACHE', {})))
@@ -0,0 +1,46 @@
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+
+
+class ConcurrencyLimiter:
+    """Caps concurrent LLM calls overall and per user, across threads of a process"""
+
+    def __init__(self, global_limit, per_user_limit):
+        self.global_limit = global_limit
+        self.per_user_limit = per_user_limit
+        self._active = 0
+        self._active_by_user = {}
+        self._condition = threading.Condition()
+
+    def _has_room(self, user_id):
+        return (
+            self._active < self.global_limit
+            and self._active_by_user.get(user_id, 0) < self.per_user_limit
+        )
+
+    @contextmanager
+    def slot(self, user_id):
+        """Block until the user may start another call, hold the slot while it runs"""
+        with self._condition:
+            self._condition.wait_for(lambda: self._has_room(user_id))
+            self._active += 1
+            self._active_by_user[user_id] = self._active_by_user.get(user_id, 0) + 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._active -= 1
+                remaining = self._active_by_user[user_id] - 1
+                if remaining:
+                    self._active_by_user[user_id] = remaining
+                else:
+                    del self._active_by_user[user_id]
+                self._condition.notify_all()
+
+
+llm_limiter = ConcurrencyLimiter(
+    global_limit=getattr(settings, 'LLM_GLOBAL_CONCURRENCY', 32),
+    per_user_limit=getattr(settings, 'LLM_PER_USER_CONCURRENCY', 4),
+)
@@ -0,0 +1,92 @@
+"""
+Conditional GET support for the endpoints the popup polls.
+
+Each endpoint derives an ETag (and, where it has one, a Last-Modified date)
+from a cheap per-user high-water mark before it builds its payload: the
+newest and oldest rows of the user's history, read in one query with index
+lookups on (user, created_at) whatever the size of the history, the
+in-memory AIModel snapshot, or the profile version. New rows move the
+newest mark and archive_history, which deletes the oldest rows, moves the
+oldest one. A client whose If-None-Match or If-Modified-Since still matches
+gets an empty 304 and nothing is serialized. While a user has history rows
+still queued in the write-behind buffer, their history is served without
+validators.
+
+Responses are marked `private, no-cache`, so browsers keep them but always
+revalidate, and vary on Authorization since they are per-user.
+"""
+
+import hashlib
+
+from django.db.models import Subquery
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+from .writebehind import write_behind
+
+
+def make_etag(*parts):
+    """Strong ETag over the given values"""
+    return '"%s"' % hashlib.sha256(repr(parts).encode('utf-8')).hexdigest()[:32]
+
+
+def _marks_query(queryset):
+    oldest = queryset.order_by('created_at', 'id')
+    return queryset.order_by('-created_at', '-id').values('created_at', 'id').annotate(
+        first_created_at=Subquery(oldest.values('created_at')[:1]),
+        first_id=Subquery(oldest.values('id')[:1]),
+    )
+
+
+def _marks(row):
+    if row is None:
+        return None, None, None
+    return row['created_at'], row['id'], (row['first_created_at'], row['first_id'])
+
+
+def high_water_mark(queryset):
+    """(latest created_at, its id, oldest (created_at, id)) of a queryset in one query"""
+    return _marks(_marks_query(queryset).first())
+
+
+async def ahigh_water_mark(queryset):
+    """Async version of high_water_mark"""
+    return _marks(await _marks_query(queryset).afirst())
+
+
+def history_validators(request, queryset, model):
+    """(etag, last_modified) of a user's history, None while some of it is not written yet"""
+    if write_behind.pending(model, request.user.id):
+        return None
+    latest, last_id, oldest = high_water_mark(queryset)
+    return make_etag(request.get_full_path(), latest, last_id, oldest), latest
+
+
+async def ahistory_validators(request, queryset, model):
+    """Async version of history_validators"""
+    if write_behind.pending(model, request.user.id):
+        return None
+    latest, last_id, oldest = await ahigh_water_mark(queryset)
+    return make_etag(request.get_full_path(), latest, last_id, oldest), latest
+
+
+def with_validators(response, etag, last_modified=None):
+    """Add the ETag, Last-Modified and caching headers to a response"""
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    response['Cache-Control'] = 'private, no-cache'
+    patch_vary_headers(response, ['Authorization'])
+    return response
+
+
+def not_modified(request, etag, last_modified=None):
+    """A 304 response when the client's copy is still current, else None"""
+    response = get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=int(last_modified.timestamp()) if last_modified is not None else None,
+    )
+    if response is None:
+        return None
+    return with_validators(response, etag, last_modified)
@@ -0,0 +1,17 @@
+"""
+Per-connection database tuning.
+
+Connected to connection_created in api.signals, so it runs once for every
+new database connection, including persistent ones being reopened.
+"""
+
+from django.conf import settings
+
+
+def configure_connection(sender, connection, **kwargs):
+    """Apply settings.SQLITE_PRAGMAS to new SQLite connections"""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+            cursor.execute(f'PRAGMA {name} = {value}')
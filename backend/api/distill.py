@@ -0,0 +1,159 @@
+import json
+import re
+import lxml.html
+from lxml import etree
+
+from .metrics import timed_function
+
+
+FIELD_TAGS = ('input', 'textarea', 'select')
+
+# Input types that never need a value from the user profile
+SKIPPED_INPUT_TYPES = {'hidden', 'submit', 'button', 'reset', 'image', 'file'}
+
+# Elements whose content is never useful for form analysis
+NOISE_TAGS = ('script', 'style', 'noscript', 'template', 'svg', 'iframe')
+
+MAX_OPTIONS = 25
+MAX_TEXT_LENGTH = 120
+
+# Ids usable as a bare #id selector; anything else goes in an attribute selector
+CSS_IDENTIFIER = re.compile(r'[A-Za-z_][\w-]*')
+
+
+def _clean_text(text):
+    """Collapse whitespace and cap length of text pulled from the page"""
+    if not text:
+        return ''
+    text = ' '.join(text.split())
+    return text[:MAX_TEXT_LENGTH]
+
+
+def _css_string(value):
+    """Quote an attribute value for a CSS selector"""
+    value = value.replace('\\', '\\\\').replace('"', '\\"')
+    return '"' + value.replace('\n', '\\a ').replace('\r', '\\d ') + '"'
+
+
+def _build_selector(elem, tag):
+    """Build the most specific CSS selector available for a field"""
+    elem_id = elem.get('id')
+    if elem_id:
+        return f'#{elem_id}' if CSS_IDENTIFIER.fullmatch(elem_id) else f'[id={_css_string(elem_id)}]'
+    name = elem.get('name')
+    if name:
+        return f'{tag}[name={_css_string(name)}]'
+    return None
+
+
+def _find_label(elem, labels_by_id):
+    """Resolve the human-readable label for a field"""
+    elem_id = elem.get('id')
+    if elem_id and elem_id in labels_by_id:
+        return labels_by_id[elem_id]
+
+    # Label wrapping the field
+    for ancestor in elem.iterancestors('label'):
+        return _clean_text(ancestor.text_content())
+
+    return _clean_text(elem.get('aria-label') or elem.get('title'))
+
+
+def _form_key(elem, form_index):
+    """Describe the form a field belongs to"""
+    for form in elem.iterancestors('form'):
+        return form.get('id') or form.get('name') or form.get('action') or f'form-{form_index[form]}'
+    form_attr = elem.get('form')
+    return form_attr or None
+
+
+@timed_function('parse_html')
+def distill_forms(html):
+    """Reduce page HTML to compact descriptors of its fillable form fields"""
+    if not html:
+        return []
+
+    try:
+        root = lxml.html.fromstring(html)
+    except (etree.ParserError, ValueError):
+        return []
+
+    etree.strip_elements(root, *NOISE_TAGS, with_tail=False)
+
+    labels_by_id = {}
+    for label in root.iter('label'):
+        target = label.get('for')
+        if target and target not in labels_by_id:
+            labels_by_id[target] = _clean_text(label.text_content())
+
+    form_index = {form: i for i, form in enumerate(root.iter('form'))}
+
+    descriptors = []
+    for elem in root.iter(*FIELD_TAGS):
+        tag = elem.tag.lower()
+        field_type = (elem.get('type') or ('text' if tag == 'input' else tag)).lower()
+        if tag == 'input' and field_type in SKIPPED_INPUT_TYPES:
+            continue
+        if elem.get('disabled') is not None:
+            continue
+
+        name = elem.get('name') or elem.get('id')
+        if not name:
+            continue
+
+        descriptor = {'tag': tag, 'type': field_type, 'name': name}
+        elem_id = elem.get('id')
+        if elem_id and elem_id != name:
+            descriptor['id'] = elem_id
+        selector = _build_selector(elem, tag)
+        if selector:
+            descriptor['selector'] = selector
+
+        label = _find_label(elem, labels_by_id)
+        if label:
+            descriptor['label'] = label
+        placeholder = _clean_text(elem.get('placeholder'))
+        if placeholder:
+            descriptor['placeholder'] = placeholder
+        autocomplete = elem.get('autocomplete')
+        if autocomplete and autocomplete.lower() not in ('on', 'off'):
+            descriptor['autocomplete'] = autocomplete.lower()
+        if elem.get('required') is not None:
+            descriptor['required'] = True
+
+        if tag == 'select':
+            options = []
+            for option in elem.iter('option'):
+                value = option.get('value')
+                text = _clean_text(option.text_content())
+                if value is None:
+                    value = text
+                if not value:
+                    # Placeholder options such as "-- Select --"
+                    continue
+                options.append(value if value == text or not text else f'{value}={text}')
+                if len(options) >= MAX_OPTIONS:
+                    break
+            descriptor['options'] = options
+        elif field_type in ('radio', 'checkbox'):
+            value = elem.get('value')
+            if value:
+                descriptor['value'] = value
+
+        form = _form_key(elem, form_index)
+        if form:
+            descriptor['form'] = form
+
+        descriptors.append(descriptor)
+
+    return descriptors
+
+
+def format_field_descriptors(descriptors):
+    """Render field descriptors as compact JSON lines for the LLM prompt"""
+    if not descriptors:
+        return '(no fillable form fields found on the page)'
+    return '\n'.join(
+        json.dumps(descriptor, ensure_ascii=False, separators=(',', ':'))
+        for descriptor in descriptors
+    )
@@ -0,0 +1,303 @@
+"""
+Provider failover, circuit breaking and hedged requests.
+
+Each LLM call goes to the user's preferred model first and, when that
+fails or times out, to the other active models in the AIModel table. Every
+provider has a circuit breaker fed with the outcome and latency of its
+recent calls: once too many of them fail or are slow, the provider is
+skipped for a while, then a single trial call decides whether it is back.
+
+With hedging enabled (settings.LLM_FAILOVER['HEDGE_AFTER']), a call that
+has not answered after that many seconds is also sent to the next
+provider, and whichever answers first wins.
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from django.conf import settings
+
+from .ai_models import ai_models
+
+SUPPORTED_PROVIDERS = ('gemini', 'groq')
+
+
+class ProviderUnavailable(Exception):
+    """No provider could answer the call"""
+
+
+class CircuitBreaker:
+    """Closed, open after too many recent failures or slow calls, half-open for one trial call"""
+
+    def __init__(self, window=20, min_calls=5, failure_rate=0.5, slow_call_duration=10.0,
+                 slow_call_rate=0.8, open_duration=30.0):
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_duration = slow_call_duration
+        self.slow_call_rate = slow_call_rate
+        self.open_duration = open_duration
+        self._outcomes = deque(maxlen=window)
+        self._opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self._opened_at is None:
+            return 'closed'
+        if time.monotonic() - self._opened_at >= self.open_duration:
+            return 'half-open'
+        return 'open'
+
+    def allow(self):
+        """Whether a call may go to the provider now"""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._trial or time.monotonic() - self._opened_at < self.open_duration:
+                return False
+            self._trial = True
+            return True
+
+    def release(self):
+        """Forget a call whose outcome will never be recorded (an abandoned hedge)"""
+        with self._lock:
+            self._trial = False
+
+    def record(self, ok, duration):
+        """Feed the outcome of a call"""
+        slow = duration >= self.slow_call_duration
+        with self._lock:
+            if self._trial:
+                self._trial = False
+                self._opened_at = None if ok and not slow else time.monotonic()
+                self._outcomes.clear()
+                return
+
+            self._outcomes.append((ok, slow))
+            if len(self._outcomes) < self.min_calls:
+                return
+            failures = sum(1 for ok, _ in self._outcomes if not ok)
+            slow_calls = sum(1 for _, slow in self._outcomes if slow)
+            if (failures / len(self._outcomes) >= self.failure_rate
+                    or slow_calls / len(self._outcomes) >= self.slow_call_rate):
+                self._opened_at = time.monotonic()
+                self._outcomes.clear()
+
+
+class ProviderRouter:
+    def __init__(self, timeout=30.0, timeouts=None, hedge_after=None, failover=True,
+                 breaker=None, max_workers=32):
+        self.timeout = timeout
+        self.timeouts = timeouts or {}
+        self.hedge_after = hedge_after
+        self.failover = failover
+        self.breaker_options = {key.lower(): value for key, value in (breaker or {}).items()}
+        self.breakers = {}
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        # Sync calls run in a pool per provider so the caller can stop waiting on a
+        # timed out provider, and a hung one cannot use up the threads of the others
+        self._executors = {}
+
+    def breaker(self, provider):
+        with self._lock:
+            if provider not in self.breakers:
+                self.breakers[provider] = CircuitBreaker(**self.breaker_options)
+            return self.breakers[provider]
+
+    def executor(self, provider):
+        with self._lock:
+            if provider not in self._executors:
+                self._executors[provider] = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                               thread_name_prefix=f'llm-{provider}')
+            return self._executors[provider]
+
+    def timeout_for(self, provider):
+        return self.timeouts.get(provider, self.timeout)
+
+    def _candidates(self, preferred, keys):
+        order = [preferred]
+        if self.failover:
+            order += [provider for provider in keys if provider != preferred]
+        providers = [(provider, keys[provider]) for provider in order
+                     if provider in SUPPORTED_PROVIDERS and keys.get(provider)]
+        if not providers:
+            raise ProviderUnavailable(f"API key not found for model: {preferred}")
+        return providers
+
+    def providers(self, preferred):
+        """(provider, api_key) pairs to try, preferred first"""
+        return self._candidates(preferred, {model.model_name: model.api_key for model in ai_models.active_models()})
+
+    async def aproviders(self, preferred):
+        """Async version of providers"""
+        return self._candidates(preferred, {model.model_name: model.api_key for model in await ai_models.aactive_models()})
+
+    def _next_allowed(self, candidates, errors):
+        for provider, api_key in candidates:
+            if self.breaker(provider).allow():
+                return provider, api_key
+            errors.append(f'{provider}: circuit open')
+        return None
+
+    def _hedge_due(self, first_started, hedged, pending_count):
+        return self.hedge_after is not None and not hedged and pending_count == 1 and \
+            time.monotonic() >= first_started + self.hedge_after
+
+    def _wait_timeout(self, pending, first_started, hedged):
+        now = time.monotonic()
+        deadlines = [started + self.timeout_for(provider) for provider, started in pending.values()]
+        if self.hedge_after is not None and not hedged and len(pending) == 1:
+            deadlines.append(first_started + self.hedge_after)
+        return max(0, min(deadlines) - now)
+
+    def _abandon(self, future, provider, started):
+        """Record the outcome of a call nobody waits for any more
+
+        A call that answers in time is recorded as it finishes; one still
+        running when its timeout passes is recorded as failed right then, so
+        a hung provider opens its breaker instead of being hedged forever.
+        """
+        recorded = threading.Lock()
+
+        def record(ok):
+            if recorded.acquire(blocking=False):
+                timer.cancel()
+                self.breaker(provider).record(ok, time.monotonic() - started)
+
+        remaining = max(0, started + self.timeout_for(provider) - time.monotonic())
+        timer = threading.Timer(remaining, record, args=(False,))
+        timer.daemon = True
+        timer.start()
+        future.add_done_callback(lambda future: record(not future.cancelled() and future.exception() is None))
+
+    def _aabandon(self, task, provider, started):
+        """Async version of _abandon: the task is cancelled once its timeout passes"""
+        def record(task):
+            timer.cancel()
+            ok = not task.cancelled() and task.exception() is None
+            self.breaker(provider).record(ok, time.monotonic() - started)
+
+        remaining = max(0, started + self.timeout_for(provider) - time.monotonic())
+        timer = asyncio.get_running_loop().call_later(remaining, task.cancel)
+        task.add_done_callback(record)
+
+    def complete(self, preferred, prompt, call):
+        """Answer prompt with call(provider, prompt, api_key), returns (response_text, provider)"""
+        candidates = iter(self.providers(preferred))
+        errors = []
+        pending = {}
+        hedged = False
+        first_started = time.monotonic()
+
+        def launch():
+            candidate = self._next_allowed(candidates, errors)
+            if candidate is None:
+                return
+            provider, api_key = candidate
+            pending[self.executor(provider).submit(call, provider, prompt, api_key)] = (provider, time.monotonic())
+
+        launch()
+        while pending:
+            done, _ = wait(pending, timeout=self._wait_timeout(pending, first_started, hedged),
+                           return_when=FIRST_COMPLETED)
+            for future in done:
+                provider, started = pending.pop(future)
+                duration = time.monotonic() - started
+                try:
+                    response_text = future.result()
+                except Exception as e:
+                    self.breaker(provider).record(False, duration)
+                    errors.append(f'{provider}: {e}')
+                    continue
+                self.breaker(provider).record(True, duration)
+                # A hedged call still running is not waited for, only its outcome is recorded
+                for other, (other_provider, other_started) in pending.items():
+                    self._abandon(other, other_provider, other_started)
+                return response_text, provider
+
+            now = time.monotonic()
+            for future, (provider, started) in list(pending.items()):
+                if now - started >= self.timeout_for(provider):
+                    del pending[future]
+                    future.cancel()
+                    self.breaker(provider).record(False, now - started)
+                    errors.append(f'{provider}: timed out')
+
+            if not pending:
+                launch()
+            elif self._hedge_due(first_started, hedged, len(pending)):
+                hedged = True
+                launch()
+
+        raise ProviderUnavailable('; '.join(errors) or 'No provider available')
+
+    async def acomplete(self, preferred, prompt, acall):
+        """Async version of complete, acall returns the awaitable answer"""
+        candidates = iter(await self.aproviders(preferred))
+        errors = []
+        pending = {}
+        hedged = False
+        first_started = time.monotonic()
+
+        def launch():
+            candidate = self._next_allowed(candidates, errors)
+            if candidate is None:
+                return
+            provider, api_key = candidate
+            pending[asyncio.ensure_future(acall(provider, prompt, api_key))] = (provider, time.monotonic())
+
+        launch()
+        try:
+            while pending:
+                done, _ = await asyncio.wait(pending, timeout=self._wait_timeout(pending, first_started, hedged),
+                                             return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    provider, started = pending.pop(task)
+                    duration = time.monotonic() - started
+                    try:
+                        response_text = task.result()
+                    except Exception as e:
+                        self.breaker(provider).record(False, duration)
+                        errors.append(f'{provider}: {e}')
+                        continue
+                    self.breaker(provider).record(True, duration)
+                    # A hedged call still running is left to run until its timeout, for its outcome
+                    for other, (other_provider, other_started) in pending.items():
+                        self._aabandon(other, other_provider, other_started)
+                    pending.clear()
+                    return response_text, provider
+
+                now = time.monotonic()
+                for task, (provider, started) in list(pending.items()):
+                    if now - started >= self.timeout_for(provider):
+                        del pending[task]
+                        task.cancel()
+                        self.breaker(provider).record(False, now - started)
+                        errors.append(f'{provider}: timed out')
+
+                if not pending:
+                    launch()
+                elif self._hedge_due(first_started, hedged, len(pending)):
+                    hedged = True
+                    launch()
+        finally:
+            # Left over when the caller is cancelled: async calls can actually be stopped
+            for task, (provider, started) in pending.items():
+                task.cancel()
+                self.breaker(provider).release()
+
+        raise ProviderUnavailable('; '.join(errors) or 'No provider available')
+
+
+def build_router(config):
+    """Build a ProviderRouter from a settings dict such as settings.LLM_FAILOVER"""
+    return ProviderRouter(**{key.lower(): value for key, value in config.items()})
+
+
+llm_router = build_router(getattr(settings, 'LLM_FAILOVER', {}))
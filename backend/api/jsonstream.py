@@ -0,0 +1,111 @@
+"""
+Incremental parsing of the analyze answer while the model generates it.
+
+The model answers {"fields": [{...}, {...}], "message": "..."}, possibly
+wrapped in ``` fences. AnalysisStreamParser is fed the text chunks as they
+arrive and hands back each field object as soon as its closing brace
+arrives, and the message once its string is complete. Only the top-level
+"fields" and "message" keys are tracked; anything before the first "{" (a
+fence, a preamble) is skipped. A field that never closes, or does not parse,
+is the only thing lost when the answer is cut off or malformed.
+"""
+
+import json
+
+
+class AnalysisStreamParser:
+    def __init__(self):
+        self.text = ''
+        self.fields = []
+        self.message = None
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._key = None
+        self._expect_key = False
+        self._in_fields = False
+        self._field_start = None
+
+    def feed(self, chunk):
+        """Consume a chunk of the answer, returns the events it completed
+
+        Events are ('field', dict) and ('message', str) tuples, in order.
+        """
+        self.text += chunk
+        events = []
+        if self._depth < 0:
+            return events
+        text = self.text
+        for index in range(self._pos, len(text)):
+            char = text[index]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    self._string_end(index, events)
+                continue
+
+            if self._depth == 0:
+                # Skip fences and any preamble up to the root object
+                if char == '{':
+                    self._depth = 1
+                    self._expect_key = True
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = index
+            elif char in '{[':
+                self._depth += 1
+                if self._depth == 2 and char == '[' and self._key == 'fields':
+                    self._in_fields = True
+                elif self._depth == 3 and char == '{' and self._in_fields:
+                    self._field_start = index
+            elif char in '}]':
+                self._depth -= 1
+                if self._depth == 2 and char == '}' and self._field_start is not None:
+                    self._field_end(index, events)
+                elif self._depth == 1 and self._in_fields:
+                    self._in_fields = False
+                elif self._depth == 0:
+                    # Root object closed, nothing after it matters
+                    self._depth = -1
+            elif self._depth == 1:
+                if char == ':':
+                    self._expect_key = False
+                elif char == ',':
+                    self._expect_key = True
+                    self._key = None
+
+            if self._depth < 0:
+                break
+        self._pos = len(text)
+        return events
+
+    def _string_end(self, index, events):
+        if self._depth != 1:
+            return
+        try:
+            value = json.loads(self.text[self._string_start:index + 1])
+        except ValueError:
+            return
+        if self._expect_key:
+            self._key = value
+        elif self._key == 'message' and self.message is None:
+            self.message = value
+            events.append(('message', value))
+
+    def _field_end(self, index, events):
+        try:
+            field = json.loads(self.text[self._field_start:index + 1])
+        except ValueError:
+            field = None
+        self._field_start = None
+        if isinstance(field, dict):
+            self.fields.append(field)
+            events.append(('field', field))
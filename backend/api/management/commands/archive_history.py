@@ -0,0 +1,184 @@
+import gzip
+import json
+import os
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from api.models import ChatHistory, FormSubmission
+
+TABLES = {
+    'chat': (ChatHistory, ['id', 'user_id', 'role', 'message', 'website', 'url', 'created_at']),
+    'submissions': (FormSubmission, ['id', 'user_id', 'website', 'url', 'fields', 'created_at']),
+}
+
+STATE_FILE = 'archive-state.json'
+
+
+class Command(BaseCommand):
+    help = (
+        'Archive ChatHistory and FormSubmission rows older than their retention period to '
+        'gzipped monthly JSONL files, then delete them. Usage: python manage.py archive_history [--dry-run]'
+    )
+
+    def add_arguments(self, parser):
+        retention = getattr(settings, 'HISTORY_RETENTION_DAYS', {})
+        parser.add_argument('--tables', nargs='+', choices=list(TABLES), default=list(TABLES),
+                            help='Tables to archive (default: all)')
+        parser.add_argument('--chat-days', type=int, default=retention.get('chat', 90),
+                            help='Archive chat messages older than this many days')
+        parser.add_argument('--submission-days', type=int, default=retention.get('submissions', 365),
+                            help='Archive form submissions older than this many days')
+        parser.add_argument('--output-dir', default=getattr(settings, 'HISTORY_ARCHIVE_DIR', 'archive'),
+                            help='Directory of the archive files')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Rows archived and deleted per transaction')
+        parser.add_argument('--pause', type=float, default=0.0,
+                            help='Seconds to sleep between batches, to leave the database to other writers')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report what would be archived')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+
+        output_dir = options['output_dir']
+        days = {'chat': options['chat_days'], 'submissions': options['submission_days']}
+
+        state = {}
+        if not options['dry_run']:
+            os.makedirs(output_dir, exist_ok=True)
+            state = self._load_state(output_dir)
+
+        for table in options['tables']:
+            cutoff = timezone.now() - timedelta(days=days[table])
+            if options['dry_run']:
+                self._report(table, cutoff, options['batch_size'])
+            else:
+                self._archive(table, cutoff, output_dir, state, options['batch_size'], options['pause'])
+
+    # Resumability: once a batch is written, the state file records the ids
+    # about to be deleted and the size of every archive file. A run stopped
+    # before the delete committed deletes those rows without writing them
+    # again, and archive files are cut back to their recorded size so a
+    # partly written batch is never left behind. A file is recorded before
+    # the first batch goes into it; files the state does not know (e.g. a
+    # lost state file) are left alone.
+
+    def _load_state(self, output_dir):
+        path = os.path.join(output_dir, STATE_FILE)
+        if not os.path.exists(path):
+            return {}
+        with open(path) as state_file:
+            return json.load(state_file)
+
+    def _save_state(self, output_dir, state):
+        path = os.path.join(output_dir, STATE_FILE)
+        with open(f'{path}.tmp', 'w') as state_file:
+            json.dump(state, state_file, indent=2)
+            state_file.flush()
+            os.fsync(state_file.fileno())
+        os.replace(f'{path}.tmp', path)
+
+    def _archive(self, table, cutoff, output_dir, state, batch_size, pause):
+        model, columns = TABLES[table]
+        table_state = state.setdefault(table, {'files': {}, 'deleting': []})
+
+        # Cut files back to what the state says was completely written
+        table_dir = os.path.join(output_dir, table)
+        if os.path.isdir(table_dir):
+            for filename in os.listdir(table_dir):
+                name = os.path.join(table, filename)
+                size = table_state['files'].get(name)
+                if size is None:
+                    continue
+                if os.path.getsize(os.path.join(output_dir, name)) > size:
+                    with open(os.path.join(output_dir, name), 'r+b') as archive_file:
+                        archive_file.truncate(size)
+
+        # Rows archived by an interrupted run but not deleted yet
+        if table_state['deleting']:
+            with transaction.atomic():
+                model.objects.filter(id__in=table_state['deleting']).delete()
+            table_state['deleting'] = []
+            self._save_state(output_dir, state)
+
+        archived = 0
+        last_id = 0
+        months = set()
+        while True:
+            rows = list(
+                model.objects.filter(created_at__lt=cutoff, id__gt=last_id)
+                .order_by('id')
+                .values(*columns)[:batch_size]
+            )
+            if not rows:
+                break
+
+            by_month = {}
+            for row in rows:
+                by_month.setdefault(os.path.join(table, f"{table}-{row['created_at']:%Y-%m}.jsonl.gz"), []).append(row)
+            new_files = [name for name in by_month if name not in table_state['files']]
+            for name in new_files:
+                path = os.path.join(output_dir, name)
+                table_state['files'][name] = os.path.getsize(path) if os.path.exists(path) else 0
+            if new_files:
+                self._save_state(output_dir, state)
+            for name, month_rows in by_month.items():
+                table_state['files'][name] = self._append(os.path.join(output_dir, name), month_rows)
+                months.add(month_rows[0]['created_at'].strftime('%Y-%m'))
+
+            last_id = rows[-1]['id']
+            table_state['deleting'] = [row['id'] for row in rows]
+            self._save_state(output_dir, state)
+
+            with transaction.atomic():
+                model.objects.filter(id__in=table_state['deleting']).delete()
+            table_state['deleting'] = []
+            self._save_state(output_dir, state)
+
+            archived += len(rows)
+            if pause:
+                time.sleep(pause)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{table}: archived and deleted {archived} rows older than {cutoff:%Y-%m-%d}'
+            + (f" into {', '.join(sorted(months))}" if months else '')
+        ))
+
+    def _append(self, path, rows):
+        """Append rows as one gzip member, returns the new file size"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        lines = ''.join(json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n' for row in rows)
+        with open(path, 'ab') as archive_file:
+            archive_file.write(gzip.compress(lines.encode('utf-8')))
+            archive_file.flush()
+            os.fsync(archive_file.fileno())
+            return archive_file.tell()
+
+    def _report(self, table, cutoff, batch_size):
+        model, _ = TABLES[table]
+        by_month = {}
+        last_id = 0
+        while True:
+            rows = list(
+                model.objects.filter(created_at__lt=cutoff, id__gt=last_id)
+                .order_by('id')
+                .values_list('id', 'created_at')[:batch_size]
+            )
+            if not rows:
+                break
+            for _, created_at in rows:
+                month = created_at.strftime('%Y-%m')
+                by_month[month] = by_month.get(month, 0) + 1
+            last_id = rows[-1][0]
+
+        total = sum(by_month.values())
+        self.stdout.write(f'{table}: would archive and delete {total} rows older than {cutoff:%Y-%m-%d}')
+        for month, count in sorted(by_month.items()):
+            self.stdout.write(f'  {month}: {count}')
@@ -0,0 +1,120 @@
+"""
+Table-driven heuristic matching of form fields to user data.
+
+Each rule names the user data value it fills and the signals that identify
+the field: substrings of its name/id (or, failing that, of its label and
+placeholder), its input type and its autocomplete token. Rules are listed by
+priority; when several match, the first one wins. All substring patterns are
+compiled into one regex alternation, so each field is scanned once.
+
+Extra rules can be supplied without code changes through
+settings.FIELD_MATCH_EXTRA_RULES (see FIELD_MATCH_RULES_FILE); they take
+priority over the built-in ones and may fill any key of the user's profile.
+"""
+
+import re
+
+from django.conf import settings
+
+DEFAULT_RULES = [
+    {'value': 'email', 'patterns': ['email', 'e-mail'], 'types': ['email'], 'autocomplete': ['email']},
+    {'value': 'full_name', 'patterns': ['fullname', 'full_name', 'full-name'], 'autocomplete': ['name']},
+    {'value': 'last_name', 'patterns': ['lastname', 'last_name', 'last-name', 'lname', 'surname', 'familyname', 'family_name'], 'autocomplete': ['family-name']},
+    {'value': 'first_name', 'patterns': ['firstname', 'first_name', 'first-name', 'fname', 'givenname', 'given_name', 'name'], 'autocomplete': ['given-name']},
+    {'value': 'phone', 'patterns': ['phone', 'mobile', 'tel'], 'types': ['tel'], 'autocomplete': ['tel', 'tel-national']},
+    {'value': 'username', 'patterns': ['username', 'user', 'login'], 'autocomplete': ['username']},
+    {'value': 'address', 'patterns': ['address', 'street'], 'autocomplete': ['street-address', 'address-line1']},
+    {'value': 'city', 'patterns': ['city', 'town'], 'autocomplete': ['address-level2']},
+    {'value': 'state', 'patterns': ['state', 'province', 'region'], 'autocomplete': ['address-level1']},
+    {'value': 'zip', 'patterns': ['zip', 'postal', 'postcode'], 'autocomplete': ['postal-code']},
+    {'value': 'country', 'patterns': ['country'], 'autocomplete': ['country', 'country-name']},
+]
+
+# Field types that are toggled rather than typed into
+UNFILLABLE_TYPES = {'radio', 'checkbox'}
+
+
+def derive_profile_values(user_data):
+    """Compute the values rules can fill, once per request"""
+    values = dict(user_data)
+    full_name = user_data.get('name', '') or ''
+    name_parts = full_name.split()
+    values.setdefault('full_name', full_name)
+    values.setdefault('first_name', name_parts[0] if name_parts else '')
+    values.setdefault('last_name', name_parts[-1] if len(name_parts) > 1 else '')
+    if not values.get('username'):
+        values['username'] = (user_data.get('email', '') or '').split('@')[0]
+    if not values.get('zip'):
+        values['zip'] = user_data.get('postal_code', '')
+    return values
+
+
+class FieldMatcher:
+    """Matches field descriptors (see api.distill) against a rule table"""
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self.by_type = {}
+        self.by_autocomplete = {}
+        pattern_rule = {}
+
+        for index, rule in enumerate(self.rules):
+            for pattern in rule.get('patterns', []):
+                pattern_rule.setdefault(pattern.lower(), index)
+            for field_type in rule.get('types', []):
+                self.by_type.setdefault(field_type.lower(), index)
+            for token in rule.get('autocomplete', []):
+                self.by_autocomplete.setdefault(token.lower(), index)
+
+        self.pattern_rule = pattern_rule
+        # Longest patterns first so 'username' is not consumed as 'user'
+        alternation = '|'.join(re.escape(p) for p in sorted(pattern_rule, key=len, reverse=True))
+        self.regex = re.compile(alternation) if alternation else None
+
+    def _best_pattern_rule(self, text):
+        if not text or self.regex is None:
+            return None
+        indexes = [self.pattern_rule[m.group(0)] for m in self.regex.finditer(text.lower())]
+        return min(indexes) if indexes else None
+
+    def match_rule(self, descriptor):
+        """Index of the rule a field matches, or None"""
+        autocomplete = descriptor.get('autocomplete', '')
+        if autocomplete:
+            # Autocomplete may carry section/shipping prefixes, the field name is last
+            index = self.by_autocomplete.get(autocomplete.split()[-1])
+            if index is not None:
+                return index
+
+        candidates = [
+            self._best_pattern_rule(f"{descriptor.get('name', '')} {descriptor.get('id', '')}"),
+            self.by_type.get(descriptor.get('type', '')),
+        ]
+        candidates = [index for index in candidates if index is not None]
+        if candidates:
+            return min(candidates)
+
+        return self._best_pattern_rule(f"{descriptor.get('label', '')} {descriptor.get('placeholder', '')}")
+
+    def match_fields(self, descriptors, user_data):
+        """Return fields with suggested values for the descriptors that match a rule"""
+        values = derive_profile_values(user_data)
+        fields = []
+        for descriptor in descriptors:
+            if descriptor.get('type') in UNFILLABLE_TYPES:
+                continue
+            index = self.match_rule(descriptor)
+            if index is None:
+                continue
+            value = values.get(self.rules[index]['value'])
+            if value:
+                fields.append({
+                    'name': descriptor['name'],
+                    'type': descriptor['type'],
+                    'value': value,
+                    'selector': descriptor.get('selector'),
+                })
+        return fields
+
+
+field_matcher = FieldMatcher(list(getattr(settings, 'FIELD_MATCH_EXTRA_RULES', [])) + DEFAULT_RULES)
@@ -0,0 +1,356 @@
+"""
+Per-request performance instrumentation and Prometheus metrics.
+
+MetricsMiddleware times every request and collects a breakdown of where the
+time went: code wrapped in `timed(phase)` (JWT auth, HTML parsing, prompt
+building, LLM calls) adds to the current request's phases, and every ORM
+query adds to the `db` phase and the query count. Views and helpers add
+prompt tokens in and out and analysis cache hits and misses with
+`record_tokens()` and `record_cache()`.
+
+At the end of the request everything is observed into histograms labelled
+with the URL route, served in the Prometheus text format by the `/metrics`
+view. With METRICS['SERVER_TIMING'] the breakdown is also sent in a
+Server-Timing header, which browser devtools show next to the request.
+
+Streamed response bodies are generated after the middleware has returned,
+so for them only the time to the first byte and the body size are recorded.
+
+Metrics are kept per process: with several worker processes, each one
+serves its own numbers, and Prometheus should scrape them all (or the
+process should be run with one worker per port).
+"""
+
+import contextvars
+import functools
+import inspect
+import threading
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse, Http404
+
+TIME_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+TOKEN_BUCKETS = (10, 50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=TIME_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) + (float('inf'),)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][index] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted((labels, [list(counts), total, count]) for labels, (counts, total, count) in self._series.items())
+        for labels, (counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames, labels, [("le", _number(bound))])} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, labels)} {count}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            values = sorted(self._values.items())
+        lines += [f'{self.name}{_labels(self.labelnames, labels)} {_number(value)}' for labels, value in values]
+        return lines
+
+
+REQUEST_SECONDS = Histogram('fillora_request_duration_seconds', 'Time to produce the response',
+                            ['method', 'route', 'status'])
+PHASE_SECONDS = Histogram('fillora_request_phase_seconds', 'Time spent per phase of a request',
+                          ['route', 'phase'])
+REQUEST_QUERIES = Histogram('fillora_request_queries', 'ORM queries per request', ['route'], COUNT_BUCKETS)
+REQUEST_BYTES = Histogram('fillora_request_size_bytes', 'Request body size as received', ['route'], SIZE_BUCKETS)
+RESPONSE_BYTES = Histogram('fillora_response_size_bytes', 'Response body size', ['route'], SIZE_BUCKETS)
+LLM_TOKENS = Histogram('fillora_llm_tokens', 'Estimated prompt (in) and answer (out) tokens per LLM call',
+                       ['route', 'direction'], TOKEN_BUCKETS)
+LLM_PROVIDER_SECONDS = Histogram('fillora_llm_provider_seconds', 'Latency of calls to each LLM provider',
+                                 ['provider', 'outcome'])
+ANALYSIS_CACHE = Counter('fillora_analysis_cache_total', 'Analysis cache lookups', ['route', 'result'])
+
+REGISTRY = [REQUEST_SECONDS, PHASE_SECONDS, REQUEST_QUERIES, REQUEST_BYTES, RESPONSE_BYTES,
+            LLM_TOKENS, LLM_PROVIDER_SECONDS, ANALYSIS_CACHE]
+
+
+class RequestMetrics:
+    """What one request spent, filled in while it runs"""
+
+    def __init__(self):
+        self.phases = {}
+        self.queries = 0
+        self.tokens = []
+        self.cache = []
+        # Batch analysis records from several worker threads at once
+        self._lock = threading.Lock()
+
+    def add(self, phase, seconds):
+        with self._lock:
+            self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def add_query(self, seconds):
+        with self._lock:
+            self.queries += 1
+            self.phases['db'] = self.phases.get('db', 0.0) + seconds
+
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+@contextmanager
+def timed(phase):
+    """Add the time spent in the block to the current request's phase"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.add(phase, time.perf_counter() - start)
+
+
+def timed_function(phase):
+    """Decorator version of timed, for sync and async functions"""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with timed(phase):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(phase):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def provider_call(provider):
+    """Observe the latency and outcome of one LLM provider call"""
+    start = time.perf_counter()
+    outcome = 'error'
+    try:
+        yield
+        outcome = 'ok'
+    finally:
+        LLM_PROVIDER_SECONDS.observe(time.perf_counter() - start, provider, outcome)
+
+
+def record_tokens(prompt_tokens, response_text):
+    """Note the prompt size and estimated answer size of an LLM call"""
+    # Imported here as api.prompts itself is instrumented with timed_function
+    from .prompts import estimate_tokens
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.tokens.append((prompt_tokens, estimate_tokens(response_text or '')))
+
+
+def record_cache(hit):
+    """Note an analysis cache hit or miss"""
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.cache.append('hit' if hit else 'miss')
+
+
+def _count_query(execute, sql, params, many, context):
+    """Execute wrapper that counts and times queries against the current request"""
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.add_query(time.perf_counter() - start)
+
+
+@receiver(connection_created)
+def _install_query_counter(sender, connection, **kwargs):
+    # Every thread has its own connection (sync_to_async workers, the batch
+    # pool), each one gets the wrapper and finds its request through _current
+    if _count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_query)
+
+
+def _route(request):
+    match = getattr(request, 'resolver_match', None)
+    return f'/{match.route}' if match is not None else 'unmatched'
+
+
+def _server_timing(metrics, total):
+    entries = [f'{phase};dur={seconds * 1000:.1f}' for phase, seconds in metrics.phases.items()]
+    entries.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(entries)
+
+
+class MetricsMiddleware:
+    """Time each request, collect its breakdown and observe it into the histograms"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.config = getattr(settings, 'METRICS', {})
+        self.enabled = self.config.get('ENABLED', True)
+        # Connections opened before this module was imported missed the signal
+        for connection in connections.all():
+            _install_query_counter(None, connection)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.enabled or request.path == '/metrics':
+            return self.get_response(request)
+
+        # Size as received, before RequestDecompressionMiddleware rewrites it
+        request_bytes = int(request.META.get('CONTENT_LENGTH') or 0)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._observe(request, response, metrics, time.perf_counter() - start, request_bytes)
+
+    async def __acall__(self, request):
+        if not self.enabled or request.path == '/metrics':
+            return await self.get_response(request)
+
+        request_bytes = int(request.META.get('CONTENT_LENGTH') or 0)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._observe(request, response, metrics, time.perf_counter() - start, request_bytes)
+
+    def _observe(self, request, response, metrics, duration, request_bytes):
+        if self.config.get('SERVER_TIMING', False):
+            response['Server-Timing'] = _server_timing(metrics, duration)
+
+        route = _route(request)
+        REQUEST_SECONDS.observe(duration, request.method, route, str(response.status_code))
+        with metrics._lock:
+            phases = list(metrics.phases.items())
+            queries = metrics.queries
+        for phase, seconds in phases:
+            PHASE_SECONDS.observe(seconds, route, phase)
+        REQUEST_QUERIES.observe(queries, route)
+        REQUEST_BYTES.observe(request_bytes, route)
+        for prompt_tokens, answer_tokens in metrics.tokens:
+            LLM_TOKENS.observe(prompt_tokens, route, 'in')
+            LLM_TOKENS.observe(answer_tokens, route, 'out')
+        for result in metrics.cache:
+            ANALYSIS_CACHE.inc(route, result)
+
+        if response.streaming:
+            # The body size is only known once it has been sent
+            response.streaming_content = self._counted(response, route)
+        else:
+            RESPONSE_BYTES.observe(len(response.content), route)
+        return response
+
+    def _counted(self, response, route):
+        content = response.streaming_content
+        if response.is_async:
+            async def counted():
+                size = 0
+                try:
+                    async for chunk in content:
+                        size += len(chunk)
+                        yield chunk
+                finally:
+                    RESPONSE_BYTES.observe(size, route)
+            return counted()
+
+        def counted():
+            size = 0
+            try:
+                for chunk in content:
+                    size += len(chunk)
+                    yield chunk
+            finally:
+                RESPONSE_BYTES.observe(size, route)
+        return counted()
+
+
+def render_metrics():
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in REGISTRY:
+        lines += metric.render()
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint, only answered for METRICS['ALLOWED_IPS']"""
+    config = getattr(settings, 'METRICS', {})
+    if not config.get('ENABLED', True) or request.META.get('REMOTE_ADDR') not in config.get('ALLOWED_IPS', ('127.0.0.1', '::1')):
+        raise Http404()
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,143 @@
+import io
+import zlib
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+
+try:
+    import zstandard
+except ImportError:  # zstd request bodies are optional
+    zstandard = None
+
+CHUNK_SIZE = 64 * 1024
+# zstd inflates up to ~32000x, so a 256 byte slice yields at most ~8 MB
+ZSTD_FEED_SIZE = 256
+
+
+class DecompressionLimitExceeded(Exception):
+    pass
+
+
+def _zlib_chunks(read, wbits):
+    """Yield decompressed chunks of a zlib/gzip stream, never more than CHUNK_SIZE at once"""
+    decompressor = zlib.decompressobj(wbits)
+    while True:
+        data = read(CHUNK_SIZE)
+        if not data:
+            break
+        while data:
+            yield decompressor.decompress(data, CHUNK_SIZE)
+            data = decompressor.unconsumed_tail
+        if decompressor.eof:
+            break
+    if not decompressor.eof:
+        raise zlib.error('Truncated compressed body')
+    yield decompressor.flush()
+
+
+def _zstd_chunks(read, wbits=None):
+    """Yield decompressed chunks of a zstd stream
+
+    decompressobj has no output limit, so input is fed in ZSTD_FEED_SIZE
+    slices to keep what one call can inflate to a few MB.
+    """
+    decompressor = zstandard.ZstdDecompressor().decompressobj()
+    while not decompressor.eof:
+        data = read(CHUNK_SIZE)
+        if not data:
+            break
+        for start in range(0, len(data), ZSTD_FEED_SIZE):
+            chunk = decompressor.decompress(data[start:start + ZSTD_FEED_SIZE])
+            if chunk:
+                yield chunk
+            if decompressor.eof:
+                break
+    if not decompressor.eof:
+        raise zstandard.ZstdError('Truncated compressed body')
+
+
+DECODERS = {
+    'gzip': (_zlib_chunks, 16 + zlib.MAX_WBITS),
+    'x-gzip': (_zlib_chunks, 16 + zlib.MAX_WBITS),
+    'deflate': (_zlib_chunks, zlib.MAX_WBITS),
+}
+if zstandard is not None:
+    DECODERS['zstd'] = (_zstd_chunks, None)
+
+
+def decompress_body(read, encoding, limit):
+    """Decompress a request body read through read(), refusing to inflate past limit bytes"""
+    decoder, wbits = DECODERS[encoding]
+    out = io.BytesIO()
+    for chunk in decoder(read, wbits):
+        if out.tell() + len(chunk) > limit:
+            raise DecompressionLimitExceeded()
+        out.write(chunk)
+    return out.getvalue()
+
+
+def _encoding(request):
+    """Content-Encoding of the request body, '' for a plain body"""
+    encoding = request.META.get('HTTP_CONTENT_ENCODING', '').strip().lower()
+    return '' if encoding == 'identity' else encoding
+
+
+class RequestDecompressionMiddleware:
+    """
+    Accept gzip, deflate and (with the zstandard package) zstd encoded
+    request bodies, so the extension can upload compressed page HTML.
+
+    Bodies are inflated incrementally and rejected with 413 as soon as they
+    exceed settings.MAX_DECOMPRESSED_REQUEST_SIZE, so a small zip bomb can't
+    exhaust memory. The middleware works under WSGI and ASGI; under ASGI the
+    body is inflated in a worker thread.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self._decompress(request) or self.get_response(request)
+
+    async def __acall__(self, request):
+        # Inflating and reading the body block, keep them off the event loop
+        if _encoding(request):
+            response = await sync_to_async(self._decompress, thread_sensitive=False)(request)
+            if response is not None:
+                return response
+        return await self.get_response(request)
+
+    def _decompress(self, request):
+        """Replace a compressed body with the inflated one, returns an error response or None"""
+        encoding = _encoding(request)
+        if not encoding:
+            return None
+        if encoding not in DECODERS:
+            return JsonResponse({'error': f'Unsupported Content-Encoding: {encoding}'}, status=415)
+
+        try:
+            body = decompress_body(request.read, encoding, settings.MAX_DECOMPRESSED_REQUEST_SIZE)
+        except DecompressionLimitExceeded:
+            return JsonResponse({'error': 'Decompressed request body too large'}, status=413)
+        except (zlib.error, EOFError) as e:
+            return JsonResponse({'error': f'Invalid {encoding} request body: {e}'}, status=400)
+        except Exception as e:
+            if zstandard is not None and isinstance(e, zstandard.ZstdError):
+                return JsonResponse({'error': f'Invalid {encoding} request body: {e}'}, status=400)
+            raise
+
+        # Downstream code sees a plain, uncompressed body
+        request._body = body
+        request._stream = io.BytesIO(body)
+        request._read_started = False
+        request.META['CONTENT_LENGTH'] = str(len(body))
+        del request.META['HTTP_CONTENT_ENCODING']
+        return None
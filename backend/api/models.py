@@ -55,10 +55,26 @@ class ChatHistory(models.Model):
         return f"{self.user.email} - {self.role} - {self.created_at}"
 
 
+class ConversationSummary(models.Model):
+    """Rolling summary of a user's older chat messages, kept up to date in the background"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='conversation_summary')
+    summary = models.TextField(blank=True, default='')
+    last_message_id = models.BigIntegerField(default=0)  # Newest ChatHistory id covered by the summary
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Conversation Summary'
+        verbose_name_plural = 'Conversation Summaries'
+
+    def __str__(self):
+        return f"{self.user.email} - Conversation Summary"
+
+
 class UserProfile(models.Model):
     """Model to store custom user profile data (key-value pairs)"""
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile_data')
     data = models.JSONField(default=dict)  # Store custom fields as {field_name: field_value}
+    version = models.PositiveIntegerField(default=1)  # Bumped on every save, see api/profiles.py
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -69,6 +85,14 @@ class UserProfile(models.Model):
     def __str__(self):
         return f"{self.user.email} - Profile Data"
 
+    def save(self, *args, **kwargs):
+        # Incremented in the database so concurrent saves never share a version
+        if not self._state.adding:
+            self.version = models.F('version') + 1
+        super().save(*args, **kwargs)
+        if isinstance(self.version, models.expressions.Combinable):
+            self.refresh_from_db(fields=['version'])
+
 
 class FormSubmission(models.Model):
     """Model to store form filling history"""
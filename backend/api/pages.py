@@ -0,0 +1,66 @@
+"""
+Content-addressed store of uploaded pages.
+
+Pages are addressed by the SHA-256 of their HTML. The store keeps the
+distilled form descriptors (see api.distill) rather than the raw HTML, so
+entries are small and a known page skips both the upload and the parse.
+"""
+
+import hashlib
+
+from django.conf import settings
+
+from .cache import build_backend
+from .distill import distill_forms
+
+
+class UnknownPage(Exception):
+    """A page was referenced by hash but is not in the store"""
+
+
+class PageHashMismatch(Exception):
+    """Uploaded HTML does not match the hash sent with it"""
+
+
+def html_digest(html):
+    """SHA-256 hex digest of page HTML, as computed by the extension"""
+    return hashlib.sha256(html.encode('utf-8')).hexdigest()
+
+
+class PageStore:
+    def __init__(self, backend):
+        self.backend = backend
+
+    @staticmethod
+    def _key(digest):
+        return f'page:{digest}'
+
+    def get(self, digest):
+        """Descriptors of a known page, or None"""
+        return self.backend.get(self._key(digest))
+
+    def put(self, html):
+        """Distill and remember a page, returns (digest, descriptors)"""
+        digest = html_digest(html)
+        descriptors = self.get(digest)
+        if descriptors is None:
+            descriptors = distill_forms(html)
+            self.backend.set(self._key(digest), descriptors)
+        return digest, descriptors
+
+
+page_store = PageStore(build_backend(getattr(settings, 'PAGE_STORE', {})))
+
+
+def resolve_page(html=None, html_hash=None):
+    """Return (digest, descriptors) for an uploaded page or a page hash"""
+    if html:
+        digest, descriptors = page_store.put(html)
+        if html_hash and html_hash != digest:
+            raise PageHashMismatch('html_hash does not match the uploaded HTML')
+        return digest, descriptors
+
+    descriptors = page_store.get(html_hash)
+    if descriptors is None:
+        raise UnknownPage('Unknown page, upload the HTML')
+    return html_hash, descriptors
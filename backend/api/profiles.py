@@ -0,0 +1,122 @@
+"""
+Versioned cache of the users' custom profile data.
+
+The LLM endpoints merge a user's UserProfile.data into every prompt, and the
+extension reloads the whole profile whenever it opens. Both now read a copy
+kept in the Django cache, keyed by user, without a query. Every save of a
+UserProfile increments its `version` column in the database; once the save
+commits, the cached copy is replaced with the new row (see api/signals.py).
+
+With a per-process cache (the default LocMemCache), other processes do not
+see that replacement, so a cached copy older than `check_interval` seconds
+is checked against the row's creation time and version, one query on the
+user_id index, and the row is only reloaded when they differ. A save made
+in another process is thus seen within `check_interval` seconds; with a
+shared CACHES backend (e.g. Redis or Memcached) it is seen right away.
+
+GET /api/profile/ sends an ETag built from the version and answers a
+matching If-None-Match with an empty 304 (see api/conditional.py).
+"""
+
+import time
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .models import UserProfile
+
+
+@dataclass(frozen=True)
+class ProfileEntry:
+    """A user's profile data at one version; version 0 means no profile yet"""
+    version: int = 0
+    data: dict = field(default_factory=dict)
+    created_at: object = None
+    updated_at: object = None
+
+    @property
+    def etag(self):
+        # The creation time tells apart a deleted and recreated profile
+        created = int(self.created_at.timestamp() * 1000) if self.created_at else 0
+        return f'"p{created}.{self.version}"'
+
+
+MISSING = ProfileEntry()
+
+
+def profile_entry(profile):
+    """ProfileEntry of a UserProfile row, or of no row"""
+    if profile is None:
+        return MISSING
+    return ProfileEntry(profile.version, profile.data, profile.created_at, profile.updated_at)
+
+
+def _matches(entry, row):
+    """Whether a cached entry is the version of the row's (created_at, version)"""
+    if row is None:
+        return entry.version == 0
+    return (entry.created_at, entry.version) == tuple(row)
+
+
+class ProfileCache:
+    def __init__(self, cache_alias='default', ttl=300, check_interval=5.0, prefix='profile'):
+        self.cache_alias = cache_alias
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self.prefix = prefix
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def _key(self, user_id):
+        return f'{self.prefix}:{user_id}'
+
+    def _version_query(self, user_id):
+        return UserProfile.objects.filter(user_id=user_id).values_list('created_at', 'version')
+
+    def _check_due(self, checked_at):
+        return time.time() - checked_at >= self.check_interval
+
+    def get(self, user_id):
+        """The user's current ProfileEntry"""
+        key = self._key(user_id)
+        cached = self.cache.get(key)
+        if cached is not None:
+            entry, checked_at = cached
+            if not self._check_due(checked_at):
+                return entry
+            if _matches(entry, self._version_query(user_id).first()):
+                self.cache.set(key, (entry, time.time()), timeout=self.ttl)
+                return entry
+        return self.refresh(user_id)
+
+    async def aget(self, user_id):
+        """Async version of get"""
+        key = self._key(user_id)
+        cached = await self.cache.aget(key)
+        if cached is not None:
+            entry, checked_at = cached
+            if not self._check_due(checked_at):
+                return entry
+            if _matches(entry, await self._version_query(user_id).afirst()):
+                await self.cache.aset(key, (entry, time.time()), timeout=self.ttl)
+                return entry
+        entry = profile_entry(await UserProfile.objects.filter(user_id=user_id).afirst())
+        await self.cache.aset(key, (entry, time.time()), timeout=self.ttl)
+        return entry
+
+    def refresh(self, user_id):
+        """Replace the cached entry with the committed row, after a profile write"""
+        entry = profile_entry(UserProfile.objects.filter(user_id=user_id).first())
+        self.cache.set(self._key(user_id), (entry, time.time()), timeout=self.ttl)
+        return entry
+
+
+def build_profile_cache(config):
+    """Build a ProfileCache from a settings dict such as settings.PROFILE_CACHE"""
+    return ProfileCache(**{key.lower(): value for key, value in config.items()})
+
+
+profile_cache = build_profile_cache(getattr(settings, 'PROFILE_CACHE', {}))
@@ -0,0 +1,234 @@
+"""
+Token-budgeted prompt assembly for the chat and analyze prompts.
+
+Each prompt is filled up to a token budget (settings.PROMPT_BUDGETS) in
+priority order: the instructions always go in, then the user's profile,
+the page's form fields (or the rolling conversation summary, for chat)
+and finally the most recent conversation turns, newest first. Whatever does not fit is left out, so a long page or a long
+message can no longer blow up the prompt.
+
+Tokens are estimated locally with a regex word/punctuation split (roughly
+one token per four characters of a word, one per punctuation mark). It
+errs on the high side and needs no provider-specific vocabulary.
+"""
+
+import re
+
+from django.conf import settings
+
+from .distill import format_field_descriptors
+from .metrics import timed_function
+
+_TOKEN_RE = re.compile(r'\w+|[^\w\s]')
+
+ANALYZE_TEMPLATE = """You are an intelligent form filling assistant. Analyze the form fields found on the page and chat history to provide form filling instructions.
+
+{user_context}
+
+Recent Chat History:
+{chat_context}
+
+Form Fields (one JSON object per line: tag, type, name, id, selector, label, placeholder, autocomplete, options, form):
+{form_fields}
+
+Task: Identify the form fields that need to be filled. Return a JSON response with the following structure:
+{{
+    "fields": [
+        {{
+            "name": "field_name_or_id",
+            "selector": "the field's selector from the list above",
+            "value": "value to fill",
+            "type": "email|text|tel|password|etc"
+        }}
+    ],
+    "message": "A friendly message explaining what will be filled"
+}}
+
+Only include fields that you can confidently identify and fill. Return ONLY valid JSON, no additional text."""
+
+CHAT_TEMPLATE = """You are a helpful AI assistant for a form filling Chrome extension.
+You help users fill forms intelligently and answer questions about form filling.
+
+{user_context}
+{summary}
+Recent conversation:
+{chat_context}
+
+User: {message}
+Assistant:"""
+
+SUMMARY_TEMPLATE = """You maintain a running summary of a conversation between a user and a form filling assistant.
+Update the summary with the new messages below. Keep facts the user stated about themselves, their preferences,
+open requests and decisions; drop small talk. Answer with the updated summary only, at most {max_words} words.
+
+Current summary:
+{summary}
+
+New messages:
+{messages}
+
+Updated summary:"""
+
+
+def _token_cost(word):
+    return 1 if len(word) <= 4 else (len(word) + 3) // 4
+
+
+def estimate_tokens(text):
+    """Fast local estimate of the number of tokens in text"""
+    return sum(_token_cost(word) for word in _TOKEN_RE.findall(text or ''))
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Cut text to about max_tokens, marking the cut"""
+    used = 0
+    for match in _TOKEN_RE.finditer(text):
+        used += _token_cost(match.group(0))
+        if used > max_tokens:
+            return text[:match.start()].rstrip() + ' [...]'
+    return text
+
+
+class Prompt:
+    """An assembled prompt with its estimated size per section"""
+
+    def __init__(self, text, sections, omitted):
+        self.text = text
+        self.sections = sections
+        self.omitted = omitted
+        self.tokens = estimate_tokens(text)
+
+    def __str__(self):
+        return self.text
+
+
+class _Budget:
+    def __init__(self, tokens):
+        self.remaining = tokens
+        self.sections = {}
+        self.omitted = {}
+
+    def _take(self, section, text):
+        cost = estimate_tokens(text)
+        if cost > self.remaining:
+            return False
+        self.remaining -= cost
+        self.sections[section] = self.sections.get(section, 0) + cost
+        return True
+
+    def require(self, section, text):
+        """Account for text that goes in whatever the budget"""
+        cost = estimate_tokens(text)
+        self.remaining -= cost
+        self.sections[section] = self.sections.get(section, 0) + cost
+
+    def lines(self, section, lines):
+        """The leading lines that fit"""
+        kept = []
+        for line in lines:
+            if not self._take(section, line):
+                break
+            kept.append(line)
+        if len(kept) < len(lines):
+            self.omitted[section] = len(lines) - len(kept)
+        return kept
+
+
+def _budgets():
+    return getattr(settings, 'PROMPT_BUDGETS', {})
+
+
+def _profile_lines(user_data):
+    return [f"- {key.replace('_', ' ').title()}: {value}" for key, value in user_data.items()]
+
+
+def build_user_context(user_data, budget=None):
+    """Describe the user's data for an LLM prompt"""
+    lines = _profile_lines(user_data)
+    if budget is not None:
+        lines = budget.lines('profile', lines)
+    return "User Information:\n" + ''.join(f'{line}\n' for line in lines)
+
+
+def _chat_context(chat_history, budget):
+    """Most recent turns that fit, oldest first"""
+    max_turns = _budgets().get('MAX_TURNS', 10)
+    max_message_tokens = _budgets().get('MAX_MESSAGE_TOKENS', 500)
+    recent = chat_history[-max_turns:] if max_turns else []
+    lines = [
+        f"{msg['role'].capitalize()}: {truncate_to_tokens(msg['message'], max_message_tokens)}"
+        for msg in reversed(recent)
+    ]
+    kept = budget.lines('history', lines)
+    if len(recent) < len(chat_history):
+        budget.omitted['history'] = budget.omitted.get('history', 0) + len(chat_history) - len(recent)
+    return '\n'.join(reversed(kept))
+
+
+@timed_function('prompt')
+def build_analyze_prompt(descriptors, chat_history, user_data, max_tokens=None):
+    """Build the form analysis prompt within the analyze token budget"""
+    budget = _Budget(max_tokens or _budgets().get('ANALYZE', 6000))
+    budget.require('instructions', ANALYZE_TEMPLATE.format(user_context='', chat_context='', form_fields=''))
+
+    user_context = build_user_context(user_data, budget)
+
+    # Reduce the page to its form fields instead of sending raw HTML
+    field_lines = format_field_descriptors(descriptors).split('\n')
+    kept = budget.lines('fields', field_lines)
+    if len(kept) < len(field_lines):
+        kept.append(f'({len(field_lines) - len(kept)} more fields omitted)')
+    form_fields = '\n'.join(kept)
+
+    chat_context = _chat_context(chat_history, budget)
+
+    text = ANALYZE_TEMPLATE.format(user_context=user_context, chat_context=chat_context, form_fields=form_fields)
+    return Prompt(text, budget.sections, budget.omitted)
+
+
+@timed_function('prompt')
+def build_chat_prompt(user_data, chat_history, message, summary='', max_tokens=None):
+    """Build the general chat prompt within the chat token budget
+    
+    summary is the rolling summary of the conversation before chat_history
+    (see api.summaries); it ranks after the profile and before the turns.
+    """
+    budget = _Budget(max_tokens or _budgets().get('CHAT', 3000))
+    budget.require('instructions', CHAT_TEMPLATE.format(user_context='', summary='', chat_context='', message=''))
+
+    message = truncate_to_tokens(message, _budgets().get('MAX_MESSAGE_TOKENS', 500))
+    budget.require('message', message)
+
+    user_context = build_user_context(user_data, budget)
+
+    summary_context = ''
+    if summary:
+        summary_context = f"Summary of the earlier conversation:\n{truncate_to_tokens(summary, _budgets().get('MAX_SUMMARY_TOKENS', 400))}\n"
+        if not budget.lines('summary', [summary_context]):
+            summary_context = ''
+
+    chat_context = _chat_context(chat_history, budget)
+
+    text = CHAT_TEMPLATE.format(user_context=user_context, summary=summary_context, chat_context=chat_context, message=message)
+    return Prompt(text, budget.sections, budget.omitted)
+
+
+def build_summary_prompt(summary, messages, max_tokens=None):
+    """Build the prompt that folds new messages into a conversation summary"""
+    max_summary_tokens = _budgets().get('MAX_SUMMARY_TOKENS', 400)
+    budget = _Budget(max_tokens or _budgets().get('SUMMARY', 3000))
+    summary = truncate_to_tokens(summary, max_summary_tokens) if summary else '(none yet)'
+    budget.require('instructions', SUMMARY_TEMPLATE.format(max_words=max_summary_tokens * 3 // 4, summary='', messages=''))
+    budget.require('summary', summary)
+
+    # Oldest messages first: they are the ones about to drop out of the prompt
+    lines = budget.lines('messages', [
+        f"{msg['role'].capitalize()}: {truncate_to_tokens(msg['message'], _budgets().get('MAX_MESSAGE_TOKENS', 500))}"
+        for msg in messages
+    ])
+
+    text = SUMMARY_TEMPLATE.format(max_words=max_summary_tokens * 3 // 4, summary=summary, messages='\n'.join(lines))
+    prompt = Prompt(text, budget.sections, budget.omitted)
+    # Only the messages that made it into the prompt may be marked as summarized
+    prompt.message_count = len(lines)
+    return prompt
@@ -0,0 +1,99 @@
+import asyncio
+import threading
+import weakref
+
+import google.generativeai as genai
+from groq import Groq, AsyncGroq
+
+GEMINI_MODEL = 'gemini-pro'
+
+
+def _build_client(provider, api_key, timeout=None):
+    """Create a sync client for a provider, timeout in seconds applies to Groq requests"""
+    if provider == 'gemini':
+        # genai keeps one global configuration; AIModel.model_name is unique,
+        # so there is only ever one Gemini key to configure.
+        genai.configure(api_key=api_key)
+        return genai.GenerativeModel(GEMINI_MODEL)
+    elif provider == 'groq':
+        return Groq(api_key=api_key, timeout=timeout)
+    raise Exception(f"Unsupported model: {provider}")
+
+
+def _build_async_client(provider, api_key, timeout=None):
+    """Create an async client for a provider, timeout in seconds applies to Groq requests"""
+    if provider == 'gemini':
+        genai.configure(api_key=api_key)
+        return genai.GenerativeModel(GEMINI_MODEL)
+    elif provider == 'groq':
+        return AsyncGroq(api_key=api_key, timeout=timeout)
+    raise Exception(f"Unsupported model: {provider}")
+
+
+def _close(client):
+    """Release the connection pool of a sync client"""
+    close = getattr(client, 'close', None)
+    if close is not None:
+        try:
+            close()
+        except Exception:
+            pass
+
+
+class ProviderClientRegistry:
+    """
+    Long-lived provider clients keyed by (provider, api_key).
+
+    Clients keep their HTTP/gRPC connections alive between requests. Async
+    clients are additionally kept per event loop, since their connection
+    pools cannot be shared between loops. Groq clients are built with the
+    timeout given the first time they are asked for; Gemini takes its
+    timeout per request.
+    """
+
+    def __init__(self):
+        self._clients = {}
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def get_client(self, provider, api_key, timeout=None):
+        key = (provider, api_key)
+        client = self._clients.get(key)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(key)
+                if client is None:
+                    client = _build_client(provider, api_key, timeout)
+                    self._clients[key] = client
+        return client
+
+    def get_async_client(self, provider, api_key, timeout=None):
+        loop = asyncio.get_running_loop()
+        key = (provider, api_key)
+        with self._lock:
+            clients = self._async_clients.setdefault(loop, {})
+            client = clients.get(key)
+            if client is None:
+                client = _build_async_client(provider, api_key, timeout)
+                clients[key] = client
+        return client
+
+    def invalidate(self, provider, keep_api_key=None):
+        """Drop clients of a provider, except those using keep_api_key"""
+        with self._lock:
+            stale = [key for key in self._clients if key[0] == provider and key[1] != keep_api_key]
+            for key in stale:
+                _close(self._clients.pop(key))
+            for clients in self._async_clients.values():
+                for key in [key for key in clients if key[0] == provider and key[1] != keep_api_key]:
+                    del clients[key]
+
+    def clear(self):
+        with self._lock:
+            for client in self._clients.values():
+                _close(client)
+            self._clients.clear()
+            self._async_clients.clear()
+
+
+provider_clients = ProviderClientRegistry()
@@ -0,0 +1,73 @@
+"""
+Fast JSON parsing and rendering for DRF.
+
+Request bodies carry whole pages of HTML and history responses carry lists
+of JSON blobs, so the stdlib json module shows up in every profile. With the
+optional orjson package installed, the parser and renderer below use it;
+without it, or for anything orjson cannot reproduce exactly (indented
+output, non-UTF-8 request charsets), they fall back to DRF's own classes.
+The output is the same as DRF's: compact, UTF-8, datetimes in ISO 8601 with
+a trailing Z, and U+2028/U+2029 escaped.
+"""
+
+import json
+
+from rest_framework import renderers, parsers
+from rest_framework.exceptions import ParseError
+from rest_framework.settings import api_settings
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:  # fall back to the stdlib json module
+    orjson = None
+
+_LINE_SEPARATORS = ((b'\xe2\x80\xa8', b'\\u2028'), (b'\xe2\x80\xa9', b'\\u2029'))
+
+# DRF's encoder handles what orjson does not know (Decimal, lazy strings, querysets...)
+_drf_default = encoders.JSONEncoder().default
+
+
+def dumps(data):
+    """Serialize data to JSON bytes the way DRF's JSONRenderer does"""
+    if orjson is None:
+        ret = json.dumps(data, cls=encoders.JSONEncoder, ensure_ascii=False, allow_nan=False,
+                         separators=(',', ':')).encode('utf-8')
+    else:
+        ret = orjson.dumps(data, default=_drf_default, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+    for raw, escaped in _LINE_SEPARATORS:
+        if raw in ret:
+            ret = ret.replace(raw, escaped)
+    return ret
+
+
+def loads(body):
+    """Parse JSON bytes or text, raising ValueError on invalid input"""
+    if orjson is None:
+        return json.loads(body)
+    return orjson.loads(body)
+
+
+class FastJSONRenderer(renderers.JSONRenderer):
+    """JSONRenderer that renders with orjson when it produces the same output"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if (self.get_indent(accepted_media_type, renderer_context or {})
+                or not api_settings.COMPACT_JSON or not api_settings.UNICODE_JSON or not api_settings.STRICT_JSON):
+            return super().render(data, accepted_media_type, renderer_context)
+        return dumps(data)
+
+
+class FastJSONParser(parsers.JSONParser):
+    """JSONParser that parses UTF-8 bodies with orjson"""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding', 'utf-8')
+        if orjson is None or encoding.lower().replace('_', '-') not in ('utf-8', 'utf8'):
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except ValueError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
@@ -0,0 +1,51 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .ai_models import ai_models
+from .authentication import invalidate_cached_user
+from .db import configure_connection
+from .models import AIModel, ChatHistory, UserProfile
+from .profiles import profile_cache
+from .providers import provider_clients
+from .summaries import conversation_summaries
+
+User = get_user_model()
+
+connection_created.connect(configure_connection, dispatch_uid='api.configure_connection')
+
+
+@receiver(post_save, sender=AIModel)
+def refresh_provider_clients(sender, instance, **kwargs):
+    """Drop pooled clients whose key was replaced or whose model was deactivated"""
+    provider_clients.invalidate(instance.model_name, keep_api_key=instance.api_key if instance.is_active else None)
+    transaction.on_commit(ai_models.invalidate)
+
+
+@receiver(post_delete, sender=AIModel)
+def drop_provider_clients(sender, instance, **kwargs):
+    """Drop pooled clients of a deleted model"""
+    provider_clients.invalidate(instance.model_name)
+    transaction.on_commit(ai_models.invalidate)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def drop_cached_user(sender, instance, **kwargs):
+    """Make JWT authentication reload a user that was changed or deleted"""
+    invalidate_cached_user(instance.pk)
+
+
+@receiver(post_save, sender=ChatHistory)
+def update_conversation_summary(sender, instance, created, **kwargs):
+    """Fold older messages into the user's summary once a turn is complete"""
+    if created and instance.role == 'assistant':
+        transaction.on_commit(lambda: conversation_summaries.schedule(instance.user_id))
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def refresh_cached_profile(sender, instance, **kwargs):
+    """Store the committed profile version in the profile cache"""
+    transaction.on_commit(lambda: profile_cache.refresh(instance.user_id))
@@ -0,0 +1,208 @@
+"""
+Single-flight coalescing of identical in-flight LLM calls.
+
+Concurrent callers with the same key (model + prompt) share one provider
+call: the first caller runs it, the others wait and get its result. Within
+a process the waiters block on the leader's call. Across processes the
+leader holds a short lock in the Django cache and publishes its result
+there; callers in other processes poll for it while the lock is held, and
+fall back to calling the provider themselves if the lock disappears
+without a result (leader failed or crashed) or they waited too long.
+
+Cross-process coalescing needs a shared CACHES backend (e.g. Redis or
+Memcached); with the default local-memory cache it only works in-process.
+"""
+
+import asyncio
+import hashlib
+import threading
+import time
+import uuid
+import weakref
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+def flight_key(model_name, prompt):
+    """Key of an LLM call, identical prompts to the same model share it"""
+    return hashlib.sha256(f'{model_name}\x00{prompt}'.encode('utf-8')).hexdigest()
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _AsyncFlight:
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self, cache_alias='default', lock_timeout=60, result_ttl=10,
+                 poll_interval=0.05, cross_process=True, prefix='flight'):
+        self.cache_alias = cache_alias
+        self.lock_timeout = lock_timeout
+        self.result_ttl = result_ttl
+        self.poll_interval = poll_interval
+        self.cross_process = cross_process
+        self.prefix = prefix
+        self.shared = 0
+        self._flights = {}
+        self._async_flights = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def _lock_key(self, key):
+        return f'{self.prefix}:lock:{key}'
+
+    def _result_key(self, key, token):
+        return f'{self.prefix}:result:{key}:{token}'
+
+    # Cross-process part. The lock value is a token naming the result key, so
+    # a result is only ever read by callers that saw the lock it belongs to.
+
+    def _run_shared(self, key, fn):
+        if not self.cross_process:
+            return fn()
+        cache = self.cache
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.lock_timeout
+        while not cache.add(self._lock_key(key), token, timeout=self.lock_timeout):
+            leader_token = cache.get(self._lock_key(key))
+            if leader_token is None:
+                continue
+            result = self._wait_remote(key, leader_token, deadline)
+            if result is not None:
+                self.shared += 1
+                return result[0]
+            if time.monotonic() >= deadline:
+                return fn()
+        try:
+            result = fn()
+            cache.set(self._result_key(key, token), (result,), timeout=self.result_ttl)
+            return result
+        finally:
+            cache.delete(self._lock_key(key))
+
+    def _wait_remote(self, key, token, deadline):
+        """Poll for another process's result, None once its lock is gone"""
+        cache = self.cache
+        while time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+            result = cache.get(self._result_key(key, token))
+            if result is not None:
+                return result
+            if cache.get(self._lock_key(key)) != token:
+                return cache.get(self._result_key(key, token))
+        return None
+
+    async def _arun_shared(self, key, coro_fn):
+        if not self.cross_process:
+            return await coro_fn()
+        cache = self.cache
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.lock_timeout
+        while not await cache.aadd(self._lock_key(key), token, timeout=self.lock_timeout):
+            leader_token = await cache.aget(self._lock_key(key))
+            if leader_token is None:
+                continue
+            result = await self._await_remote(key, leader_token, deadline)
+            if result is not None:
+                self.shared += 1
+                return result[0]
+            if time.monotonic() >= deadline:
+                return await coro_fn()
+        try:
+            result = await coro_fn()
+            await cache.aset(self._result_key(key, token), (result,), timeout=self.result_ttl)
+            return result
+        finally:
+            await cache.adelete(self._lock_key(key))
+
+    async def _await_remote(self, key, token, deadline):
+        """Async version of _wait_remote"""
+        cache = self.cache
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.poll_interval)
+            result = await cache.aget(self._result_key(key, token))
+            if result is not None:
+                return result
+            if await cache.aget(self._lock_key(key)) != token:
+                return await cache.aget(self._result_key(key, token))
+        return None
+
+    # In-process part
+
+    def do(self, key, fn):
+        """Return fn(), sharing one call among concurrent callers with the same key"""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            flight.done.wait()
+            self.shared += 1
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = self._run_shared(key, fn)
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    async def ado(self, key, coro_fn):
+        """Async version of do, coro_fn returns the awaitable to share"""
+        # Tasks belong to one event loop, so flights are kept per loop
+        flights = self._async_flights.setdefault(asyncio.get_running_loop(), {})
+        flight = flights.get(key)
+        if flight is None:
+            # The call runs as its own task, so cancelling the caller that
+            # started it does not cancel it for the others
+            flight = flights[key] = _AsyncFlight(asyncio.ensure_future(self._arun_shared(key, coro_fn)))
+            flight.task.add_done_callback(lambda task: self._async_flight_done(flights, key, flight))
+        else:
+            self.shared += 1
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if flight.waiters == 1:
+                # Nobody is left to use the answer
+                flight.task.cancel()
+            raise
+        finally:
+            flight.waiters -= 1
+
+    @staticmethod
+    def _async_flight_done(flights, key, flight):
+        if flights.get(key) is flight:
+            del flights[key]
+        if not flight.task.cancelled():
+            # Only waiters should see an error, not the loop's exception handler
+            flight.task.exception()
+
+
+def build_single_flight(config):
+    """Build a SingleFlight from a settings dict such as settings.LLM_SINGLE_FLIGHT"""
+    return SingleFlight(**{key.lower(): value for key, value in config.items()})
+
+
+llm_flight = build_single_flight(getattr(settings, 'LLM_SINGLE_FLIGHT', {}))
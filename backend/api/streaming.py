@@ -0,0 +1,156 @@
+"""
+Server-sent event streams for chat responses.
+
+Events:
+    token  {"text": "..."}                           - next chunk of the answer
+    done   {"message": "...", "model_used": "..."}   - full answer, saved to history
+    error  {"error": "..."}                          - provider failure
+
+Streamed page analysis is sent as NDJSON instead, one object per line:
+    {"type": "field", "field": {...}}    - a field, as soon as the model closed it
+    {"type": "message", "message": "..."} - the answer's message, once complete
+    {"type": "done", "fields": n, "message": "...", "model_used": "...", "complete": bool, ...}
+    {"type": "error", "error": "..."}
+`complete` is false when the answer was cut off or malformed; the fields
+sent before that point are still valid.
+"""
+
+import asyncio
+import json
+from urllib.parse import urlparse
+
+from django.http import StreamingHttpResponse
+
+from .models import ChatHistory
+from .utils import stream_llm, astream_llm, stream_analysis, astream_analysis
+from .writebehind import write_behind
+
+
+def sse_event(event, data):
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def sse_response(events):
+    """Wrap an (async) iterator of SSE strings in an unbuffered streaming response"""
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Disable proxy buffering (nginx)
+    return response
+
+
+def wants_stream(request):
+    """Whether the client asked for a streamed answer"""
+    flag = request.data.get('stream') if hasattr(request, 'data') else None
+    if flag is None:
+        flag = request.GET.get('stream')
+    return flag in (True, 1, '1', 'true', 'True')
+
+
+def _assistant_message(user, message, website, url):
+    return ChatHistory(
+        user=user,
+        role='assistant',
+        message=message,
+        website=website,
+        url=url if url else None,
+    )
+
+
+def chat_event_stream(user, model_name, prompt, api_key, website, url):
+    """Forward provider chunks as SSE and save the answer once it is complete"""
+    chunks = []
+    stream = stream_llm(model_name, prompt, api_key)
+    try:
+        for text in stream:
+            chunks.append(text)
+            yield sse_event('token', {'text': text})
+    except GeneratorExit:
+        # Client disconnected: keep the part of the answer it already received
+        stream.close()
+        if chunks:
+            write_behind.add(_assistant_message(user, ''.join(chunks), website, url))
+        raise
+    except Exception as e:
+        yield sse_event('error', {'error': str(e)})
+        return
+
+    response_text = ''.join(chunks)
+    write_behind.add(_assistant_message(user, response_text, website, url))
+    yield sse_event('done', {'message': response_text, 'model_used': model_name})
+
+
+async def achat_event_stream(user, model_name, prompt, api_key, website, url):
+    """Async version of chat_event_stream"""
+    chunks = []
+    stream = astream_llm(model_name, prompt, api_key)
+    try:
+        async for text in stream:
+            chunks.append(text)
+            yield sse_event('token', {'text': text})
+    except (GeneratorExit, asyncio.CancelledError):
+        await stream.aclose()
+        if chunks:
+            await write_behind.aadd(_assistant_message(user, ''.join(chunks), website, url))
+        raise
+    except Exception as e:
+        yield sse_event('error', {'error': str(e)})
+        return
+
+    response_text = ''.join(chunks)
+    await write_behind.aadd(_assistant_message(user, response_text, website, url))
+    yield sse_event('done', {'message': response_text, 'model_used': model_name})
+
+
+def ndjson_line(data):
+    """Format one NDJSON line"""
+    return json.dumps(data) + '\n'
+
+
+def ndjson_response(lines):
+    """Wrap an (async) iterator of NDJSON lines in an unbuffered streaming response"""
+    response = StreamingHttpResponse(lines, content_type='application/x-ndjson')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Disable proxy buffering (nginx)
+    return response
+
+
+def _analysis_line(event, data, extra):
+    if event == 'field':
+        return ndjson_line({'type': 'field', 'field': data})
+    if event == 'message':
+        return ndjson_line({'type': 'message', 'message': data})
+    return ndjson_line({
+        'type': 'done',
+        'fields': len(data.get('fields', [])),
+        'message': data.get('message', ''),
+        'model_used': data.get('model_used'),
+        'prompt_tokens': data.get('prompt_tokens'),
+        'cached': data.get('cached', False),
+        'complete': data['complete'],
+        **extra,
+    })
+
+
+def analyze_field_stream(user, descriptors, chat_history, user_data, model_name, api_key, url, extra):
+    """Stream analysis events as NDJSON and save the answer's message once it is complete"""
+    try:
+        for event, data in stream_analysis(descriptors, chat_history, user_data, model_name, api_key):
+            if event == 'done':
+                write_behind.add(_assistant_message(user, data.get('message') or 'Analysis complete',
+                                                    urlparse(url).netloc, url))
+            yield _analysis_line(event, data, extra)
+    except Exception as e:
+        yield ndjson_line({'type': 'error', 'error': str(e)})
+
+
+async def aanalyze_field_stream(user, descriptors, chat_history, user_data, model_name, api_key, url, extra):
+    """Async version of analyze_field_stream"""
+    try:
+        async for event, data in astream_analysis(descriptors, chat_history, user_data, model_name, api_key):
+            if event == 'done':
+                await write_behind.aadd(_assistant_message(user, data.get('message') or 'Analysis complete',
+                                                           urlparse(url).netloc, url))
+            yield _analysis_line(event, data, extra)
+    except Exception as e:
+        yield ndjson_line({'type': 'error', 'error': str(e)})
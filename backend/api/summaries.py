@@ -0,0 +1,117 @@
+"""
+Rolling per-user conversation summaries.
+
+The chat prompt carries a summary of the user's older messages plus only
+the few most recent turns, so its size stays flat however long the
+conversation gets. After each assistant reply a background thread folds
+the messages that have dropped out of the recent turns into the summary;
+nothing of this runs on the request path.
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.utils import timezone
+
+from .models import ChatHistory, ConversationSummary
+from .prompts import build_summary_prompt
+from .utils import call_llm_routed
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+
+class ConversationSummarizer:
+    def __init__(self, enabled=True, keep_turns=6, min_new_messages=4, max_messages=100, max_workers=1):
+        self.enabled = enabled
+        self.keep_turns = keep_turns
+        self.min_new_messages = min_new_messages
+        self.max_messages = max_messages
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='summary')
+        self._queued = set()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        """(summary, last summarized ChatHistory id) of a user"""
+        row = ConversationSummary.objects.filter(user_id=user_id).values_list('summary', 'last_message_id').first()
+        return row or ('', 0)
+
+    async def aget(self, user_id):
+        """Async version of get"""
+        row = await ConversationSummary.objects.filter(user_id=user_id).values_list('summary', 'last_message_id').afirst()
+        return row or ('', 0)
+
+    def schedule(self, user_id):
+        """Update a user's summary in the background, at most one pending update per user"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if user_id in self._queued:
+                return
+            self._queued.add(user_id)
+        try:
+            self._executor.submit(self._run, user_id)
+        except RuntimeError:
+            # The interpreter is shutting down, a later turn will catch up
+            with self._lock:
+                self._queued.discard(user_id)
+
+    def _run(self, user_id):
+        with self._lock:
+            # Messages saved from now on schedule another update
+            self._queued.discard(user_id)
+        try:
+            self.update(user_id)
+        except Exception:
+            # The summary is best effort, the next turn will try again
+            logger.exception('Updating the conversation summary of user %s failed', user_id)
+        finally:
+            connections.close_all()
+
+    def update(self, user_id):
+        """Fold messages older than the recent turns into the summary, returns whether it changed"""
+        summary, _ = ConversationSummary.objects.get_or_create(user_id=user_id)
+
+        recent_ids = list(
+            ChatHistory.objects.filter(user_id=user_id)
+            .order_by('-id')
+            .values_list('id', flat=True)[:self.keep_turns]
+        )
+        if len(recent_ids) < self.keep_turns:
+            return False
+
+        messages = list(
+            ChatHistory.objects.filter(user_id=user_id, id__gt=summary.last_message_id, id__lt=recent_ids[-1])
+            .order_by('id')
+            .values('id', 'role', 'message')[:self.max_messages]
+        )
+        if len(messages) < self.min_new_messages:
+            return False
+
+        model_name = User.objects.filter(pk=user_id).values_list('preferred_ai_model', flat=True).first() or 'gemini'
+        prompt = build_summary_prompt(summary.summary, messages)
+        if not prompt.message_count:
+            return False
+        response_text, _ = call_llm_routed(model_name, prompt.text)
+
+        # Another process may have summarized the same messages meanwhile
+        return bool(ConversationSummary.objects.filter(
+            pk=summary.pk, last_message_id=summary.last_message_id,
+        ).update(
+            summary=response_text.strip(),
+            last_message_id=messages[prompt.message_count - 1]['id'],
+            updated_at=timezone.now(),
+        ))
+
+
+def build_summarizer(config):
+    """Build a ConversationSummarizer from a settings dict such as settings.CHAT_SUMMARY"""
+    return ConversationSummarizer(**{key.lower(): value for key, value in config.items()})
+
+
+conversation_summaries = build_summarizer(getattr(settings, 'CHAT_SUMMARY', {}))
@@ -1,14 +1,19 @@
 from django.urls import path
-from . import views
+from . import views, async_views
 
 urlpatterns = [
     path('social-login/', views.social_login, name='social_login'),
+    path('token/refresh/', views.refresh_token, name='refresh_token'),
     path('analyze-page/', views.analyze_page, name='analyze_page'),
     path('analyze/', views.analyze_with_ai, name='analyze_with_ai'),
+    path('analyze/batch/', views.analyze_batch, name='analyze_batch'),
     path('fill-form/', views.fill_form, name='fill_form'),
     path('history/', views.history, name='history'),
+    path('history/<int:submission_id>/', views.history_detail, name='history_detail'),
     path('model/', views.model_settings, name='model_settings'),
     path('chat/', views.chat, name='chat'),
     path('profile/', views.profile, name='profile'),
+    # Async variants of the LLM-bound endpoints, for deployments under ASGI
+    path('async/analyze/', async_views.analyze_with_ai, name='analyze_with_ai_async'),
+    path('async/chat/', async_views.chat, name='chat_async'),
 ]
-
@@ -1,18 +1,30 @@
 import jwt as pyjwt
 from django.conf import settings
-from bs4 import BeautifulSoup
 import re
-import google.generativeai as genai
-from groq import Groq
-from .models import AIModel
+import time
+from asgiref.sync import sync_to_async
+from .ai_models import ai_models
+from .distill import distill_forms
+from .matcher import field_matcher
+from .cache import analysis_cache, chat_version, form_fingerprint, profile_version
+from .providers import provider_clients
+from .singleflight import llm_flight, flight_key
+from .failover import llm_router
+from .prompts import build_analyze_prompt
+from .jsonstream import AnalysisStreamParser
+from .metrics import timed, provider_call, record_tokens, record_cache
 import json
 
 
-def generate_jwt_token(user):
-    """Generate JWT token for user"""
+def _encode_jwt(user, token_type, lifetime):
+    """Encode a signed JWT of the given type for user"""
+    now = int(time.time())
     payload = {
         'user_id': user.id,
         'email': user.email,
+        'type': token_type,
+        'iat': now,
+        'exp': now + lifetime,
     }
     token = pyjwt.encode(payload, settings.JWT_SECRET, algorithm='HS256')
     # In PyJWT 2.0+, encode returns a string, not bytes
@@ -21,21 +33,31 @@ def generate_jwt_token(user):
     return token
 
 
+def generate_jwt_token(user):
+    """Generate short-lived JWT access token for user"""
+    return _encode_jwt(user, 'access', settings.JWT_ACCESS_TOKEN_LIFETIME)
+
+
+def generate_refresh_token(user):
+    """Generate long-lived JWT refresh token for user"""
+    return _encode_jwt(user, 'refresh', settings.JWT_REFRESH_TOKEN_LIFETIME)
+
+
 def get_ai_model_key(model_name):
     """Get API key for specified AI model"""
-    try:
-        ai_model = AIModel.objects.get(model_name=model_name, is_active=True)
-        return ai_model.api_key
-    except AIModel.DoesNotExist:
-        return None
+    return ai_models.get_key(model_name)
+
+
+async def aget_ai_model_key(model_name):
+    """Async version of get_ai_model_key"""
+    return await ai_models.aget_key(model_name)
 
 
 def call_gemini_api(prompt, api_key):
     """Call Google Gemini API"""
     try:
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-pro')
-        response = model.generate_content(prompt)
+        model = provider_clients.get_client('gemini', api_key)
+        response = model.generate_content(prompt, request_options={'timeout': llm_router.timeout_for('gemini')})
         return response.text
     except Exception as e:
         raise Exception(f"Gemini API error: {str(e)}")
@@ -44,7 +66,7 @@ def call_gemini_api(prompt, api_key):
 def call_groq_api(prompt, api_key):
     """Call Groq API"""
     try:
-        client = Groq(api_key=api_key)
+        client = provider_clients.get_client('groq', api_key, llm_router.timeout_for('groq'))
         response = client.chat.completions.create(
             model="llama3-8b-8192",
             messages=[
@@ -57,58 +79,172 @@ def call_groq_api(prompt, api_key):
         raise Exception(f"Groq API error: {str(e)}")
 
 
-def analyze_with_llm(html, chat_history, user_data, model_name='gemini'):
-    """Analyze page HTML using LLM (Gemini or Groq)"""
-    api_key = get_ai_model_key(model_name)
-    if not api_key:
-        raise Exception(f"API key not found for model: {model_name}")
-    
-    # Prepare chat history context
-    chat_context = "\n".join([
-        f"{msg['role'].capitalize()}: {msg['message']}" 
-        for msg in chat_history[-10:]  # Last 10 messages
-    ])
-    
-    # Prepare user data context (includes all profile fields)
-    user_context = "User Information:\n"
-    for key, value in user_data.items():
-        user_context += f"- {key.replace('_', ' ').title()}: {value}\n"
-    
-    # Create prompt for LLM
-    prompt = f"""You are an intelligent form filling assistant. Analyze the HTML page and chat history to provide form filling instructions.
-
-{user_context}
-
-Recent Chat History:
-{chat_context}
-
-HTML Page Content:
-{html[:50000]}  # Limit to 50k chars
-
-Task: Analyze the HTML and identify form fields that need to be filled. Return a JSON response with the following structure:
-{{
-    "fields": [
-        {{
-            "name": "field_name_or_id",
-            "selector": "CSS selector or [name='field_name']",
-            "value": "value to fill",
-            "type": "email|text|tel|password|etc"
-        }}
-    ],
-    "message": "A friendly message explaining what will be filled"
-}}
-
-Only include fields that you can confidently identify and fill. Return ONLY valid JSON, no additional text."""
-    
-    # Call appropriate API
+async def acall_gemini_api(prompt, api_key):
+    """Call Google Gemini API without blocking the event loop"""
+    try:
+        model = provider_clients.get_async_client('gemini', api_key)
+        response = await model.generate_content_async(prompt, request_options={'timeout': llm_router.timeout_for('gemini')})
+        return response.text
+    except Exception as e:
+        raise Exception(f"Gemini API error: {str(e)}")
+
+
+async def acall_groq_api(prompt, api_key):
+    """Call Groq API without blocking the event loop"""
+    try:
+        client = provider_clients.get_async_client('groq', api_key, llm_router.timeout_for('groq'))
+        response = await client.chat.completions.create(
+            model="llama3-8b-8192",
+            messages=[
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.7,
+        )
+        return response.choices[0].message.content
+    except Exception as e:
+        raise Exception(f"Groq API error: {str(e)}")
+
+
+def call_llm(model_name, prompt, api_key):
+    """Call the API of the given model"""
+    with provider_call(model_name):
+        if model_name == 'gemini':
+            return call_gemini_api(prompt, api_key)
+        elif model_name == 'groq':
+            return call_groq_api(prompt, api_key)
+        raise Exception(f"Unsupported model: {model_name}")
+
+
+async def acall_llm(model_name, prompt, api_key):
+    """Async version of call_llm"""
+    with provider_call(model_name):
+        if model_name == 'gemini':
+            return await acall_gemini_api(prompt, api_key)
+        elif model_name == 'groq':
+            return await acall_groq_api(prompt, api_key)
+        raise Exception(f"Unsupported model: {model_name}")
+
+
+def call_llm_routed(model_name, prompt):
+    """Ask the preferred model, failing over to other active ones; returns (response_text, model_used)"""
+    return llm_router.complete(model_name, prompt, call_llm)
+
+
+async def acall_llm_routed(model_name, prompt):
+    """Async version of call_llm_routed"""
+    return await llm_router.acomplete(model_name, prompt, acall_llm)
+
+
+def call_llm_coalesced(model_name, prompt):
+    """call_llm_routed, sharing one provider call among concurrent identical prompts"""
+    with timed('llm'):
+        return llm_flight.do(flight_key(model_name, prompt), lambda: call_llm_routed(model_name, prompt))
+
+
+async def acall_llm_coalesced(model_name, prompt):
+    """Async version of call_llm_coalesced"""
+    with timed('llm'):
+        return await llm_flight.ado(flight_key(model_name, prompt), lambda: acall_llm_routed(model_name, prompt))
+
+
+def stream_gemini_api(prompt, api_key):
+    """Stream text chunks from Google Gemini API as they are generated"""
+    try:
+        model = provider_clients.get_client('gemini', api_key)
+        for chunk in model.generate_content(prompt, stream=True):
+            if chunk.text:
+                yield chunk.text
+    except GeneratorExit:
+        raise
+    except Exception as e:
+        raise Exception(f"Gemini API error: {str(e)}")
+
+
+def stream_groq_api(prompt, api_key):
+    """Stream text chunks from Groq API as they are generated"""
+    try:
+        client = provider_clients.get_client('groq', api_key, llm_router.timeout_for('groq'))
+        stream = client.chat.completions.create(
+            model="llama3-8b-8192",
+            messages=[
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.7,
+            stream=True,
+        )
+        try:
+            for chunk in stream:
+                content = chunk.choices[0].delta.content if chunk.choices else None
+                if content:
+                    yield content
+        finally:
+            # Release the connection when the consumer stops early
+            stream.close()
+    except GeneratorExit:
+        raise
+    except Exception as e:
+        raise Exception(f"Groq API error: {str(e)}")
+
+
+async def astream_gemini_api(prompt, api_key):
+    """Async version of stream_gemini_api"""
+    try:
+        model = provider_clients.get_async_client('gemini', api_key)
+        response = await model.generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+    except GeneratorExit:
+        raise
+    except Exception as e:
+        raise Exception(f"Gemini API error: {str(e)}")
+
+
+async def astream_groq_api(prompt, api_key):
+    """Async version of stream_groq_api"""
+    try:
+        client = provider_clients.get_async_client('groq', api_key, llm_router.timeout_for('groq'))
+        stream = await client.chat.completions.create(
+            model="llama3-8b-8192",
+            messages=[
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.7,
+            stream=True,
+        )
+        try:
+            async for chunk in stream:
+                content = chunk.choices[0].delta.content if chunk.choices else None
+                if content:
+                    yield content
+        finally:
+            await stream.close()
+    except GeneratorExit:
+        raise
+    except Exception as e:
+        raise Exception(f"Groq API error: {str(e)}")
+
+
+def stream_llm(model_name, prompt, api_key):
+    """Stream text chunks from the API of the given model"""
     if model_name == 'gemini':
-        response_text = call_gemini_api(prompt, api_key)
+        return stream_gemini_api(prompt, api_key)
     elif model_name == 'groq':
-        response_text = call_groq_api(prompt, api_key)
-    else:
-        raise Exception(f"Unsupported model: {model_name}")
-    
-    # Try to extract JSON from response
+        return stream_groq_api(prompt, api_key)
+    raise Exception(f"Unsupported model: {model_name}")
+
+
+def astream_llm(model_name, prompt, api_key):
+    """Async version of stream_llm"""
+    if model_name == 'gemini':
+        return astream_gemini_api(prompt, api_key)
+    elif model_name == 'groq':
+        return astream_groq_api(prompt, api_key)
+    raise Exception(f"Unsupported model: {model_name}")
+
+
+def parse_analysis_response(response_text):
+    """Parse the LLM's JSON answer, returns (result, parsed_ok)"""
     try:
         # Remove markdown code blocks if present
         response_text = response_text.strip()
@@ -120,85 +256,136 @@ Only include fields that you can confidently identify and fill. Return ONLY vali
             response_text = response_text[:-3]
         response_text = response_text.strip()
         
-        result = json.loads(response_text)
-        return result
+        return json.loads(response_text), True
     except json.JSONDecodeError:
         # If JSON parsing fails, try to extract fields manually
         return {
             "fields": [],
             "message": response_text
-        }
+        }, False
 
 
-def analyze_page_html(html, user_data):
-    """Analyze HTML and extract form fields with suggested values (fallback method)"""
-    soup = BeautifulSoup(html, 'lxml')
-    fields = []
+def _analysis_cache_key(descriptors, chat_history, user_data, model_name):
+    """Same form structure, profile data and recent chat turns give the same answer"""
+    return analysis_cache.make_key(form_fingerprint(descriptors), profile_version(user_data), model_name,
+                                   chat_version(chat_history))
+
+
+def analyze_with_llm(html, chat_history, user_data, model_name='gemini', descriptors=None):
+    """Analyze page HTML (or its already distilled descriptors) using LLM (Gemini or Groq)"""
+    if descriptors is None:
+        descriptors = distill_forms(html)
     
-    # Find all input fields
-    inputs = soup.find_all(['input', 'textarea', 'select'])
+    cache_key = _analysis_cache_key(descriptors, chat_history, user_data, model_name)
+    cached = analysis_cache.get(cache_key)
+    record_cache(cached is not None)
+    if cached is not None:
+        return dict(cached, cached=True)
     
-    for input_elem in inputs:
-        field_name = input_elem.get('name') or input_elem.get('id', '')
-        field_type = input_elem.get('type', 'text').lower()
-        field_tag = input_elem.name.lower()
-        
-        if not field_name:
-            continue
-        
-        # Determine value based on field name/type
-        value = None
-        field_lower = field_name.lower()
-        
-        # Email fields
-        if 'email' in field_lower or field_type == 'email':
-            value = user_data.get('email', '')
-        
-        # Name fields
-        elif 'name' in field_lower or 'firstname' in field_lower or 'fname' in field_lower:
-            value = user_data.get('name', '').split()[0] if user_data.get('name') else ''
-        elif 'lastname' in field_lower or 'lname' in field_lower or 'surname' in field_lower:
-            name_parts = user_data.get('name', '').split()
-            value = name_parts[-1] if len(name_parts) > 1 else ''
-        elif 'fullname' in field_lower or 'full_name' in field_lower:
-            value = user_data.get('name', '')
-        
-        # Phone fields
-        elif 'phone' in field_lower or 'tel' in field_lower or field_type == 'tel':
-            value = user_data.get('phone', '')
-        
-        # Username fields
-        elif 'username' in field_lower or 'user' in field_lower:
-            value = user_data.get('username', '') or user_data.get('email', '').split('@')[0]
-        
-        # Address fields
-        elif 'address' in field_lower:
-            value = user_data.get('address', '')
-        
-        # City fields
-        elif 'city' in field_lower:
-            value = user_data.get('city', '')
-        
-        # State/Province fields
-        elif 'state' in field_lower or 'province' in field_lower:
-            value = user_data.get('state', '')
-        
-        # Zip/Postal code
-        elif 'zip' in field_lower or 'postal' in field_lower:
-            value = user_data.get('zip', '') or user_data.get('postal_code', '')
-        
-        # Country
-        elif 'country' in field_lower:
-            value = user_data.get('country', '')
-        
-        if value:
-            selector = f'[name="{field_name}"]' if field_name else None
-            fields.append({
-                'name': field_name,
-                'type': field_type,
-                'value': value,
-                'selector': selector,
-            })
+    prompt = build_analyze_prompt(descriptors, chat_history, user_data)
+    response_text, model_used = call_llm_coalesced(model_name, prompt.text)
+    record_tokens(prompt.tokens, response_text)
+    
+    result, parsed = parse_analysis_response(response_text)
+    result['model_used'] = model_used
+    result['prompt_tokens'] = prompt.tokens
+    if parsed:
+        analysis_cache.set(cache_key, result)
+    return result
+
+
+async def aanalyze_with_llm(html, chat_history, user_data, model_name='gemini', descriptors=None):
+    """Async version of analyze_with_llm"""
+    if descriptors is None:
+        # Parsing large pages is CPU-bound, keep it off the event loop
+        descriptors = await sync_to_async(distill_forms, thread_sensitive=False)(html)
+    
+    cache_key = _analysis_cache_key(descriptors, chat_history, user_data, model_name)
+    cached = analysis_cache.get(cache_key)
+    record_cache(cached is not None)
+    if cached is not None:
+        return dict(cached, cached=True)
+    
+    prompt = build_analyze_prompt(descriptors, chat_history, user_data)
+    response_text, model_used = await acall_llm_coalesced(model_name, prompt.text)
+    record_tokens(prompt.tokens, response_text)
+    
+    result, parsed = parse_analysis_response(response_text)
+    result['model_used'] = model_used
+    result['prompt_tokens'] = prompt.tokens
+    if parsed:
+        analysis_cache.set(cache_key, result)
+    return result
+
+
+def _cached_events(cached):
+    for field in cached.get('fields', []):
+        yield 'field', field
+    yield 'done', dict(cached, cached=True, complete=True)
+
+
+def _stream_result(parser, model_name, prompt, cache_key):
+    """Final result of a streamed analysis; only a fully parsed answer is cached"""
+    result, parsed = parse_analysis_response(parser.text)
+    parsed = parsed and isinstance(result, dict)
+    if not parsed:
+        # Keep the fields that closed before the answer went wrong
+        result = {'fields': parser.fields, 'message': parser.message or ''}
+    result['model_used'] = model_name
+    result['prompt_tokens'] = prompt.tokens
+    if parsed:
+        analysis_cache.set(cache_key, result)
+    return dict(result, complete=parsed)
+
+
+def stream_analysis(descriptors, chat_history, user_data, model_name, api_key):
+    """
+    Analyze a page with a streamed LLM answer.
+
+    Yields ('field', dict) as each field object of the answer closes,
+    ('message', str) once the message is complete and finally ('done', result)
+    with the same result analyze_with_llm returns, plus `complete`.
+    """
+    cache_key = _analysis_cache_key(descriptors, chat_history, user_data, model_name)
+    cached = analysis_cache.get(cache_key)
+    record_cache(cached is not None)
+    if cached is not None:
+        yield from _cached_events(cached)
+        return
     
-    return fields
+    prompt = build_analyze_prompt(descriptors, chat_history, user_data)
+    parser = AnalysisStreamParser()
+    stream = stream_llm(model_name, prompt.text, api_key)
+    try:
+        for chunk in stream:
+            yield from parser.feed(chunk)
+    finally:
+        stream.close()
+    yield 'done', _stream_result(parser, model_name, prompt, cache_key)
 
+
+async def astream_analysis(descriptors, chat_history, user_data, model_name, api_key):
+    """Async version of stream_analysis"""
+    cache_key = _analysis_cache_key(descriptors, chat_history, user_data, model_name)
+    cached = analysis_cache.get(cache_key)
+    record_cache(cached is not None)
+    if cached is not None:
+        for event in _cached_events(cached):
+            yield event
+        return
+    
+    prompt = build_analyze_prompt(descriptors, chat_history, user_data)
+    parser = AnalysisStreamParser()
+    stream = astream_llm(model_name, prompt.text, api_key)
+    try:
+        async for chunk in stream:
+            for event in parser.feed(chunk):
+                yield event
+    finally:
+        await stream.aclose()
+    yield 'done', _stream_result(parser, model_name, prompt, cache_key)
+
+
+def analyze_page_html(html, user_data):
+    """Analyze HTML and extract form fields with suggested values (fallback method)"""
+    return field_matcher.match_fields(distill_forms(html), user_data)
@@ -1,19 +1,50 @@
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, authentication_classes
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed
 from django.contrib.auth import get_user_model
 from google.oauth2 import id_token
 from google.auth.transport import requests as google_requests
 from django.conf import settings
-from .models import FormSubmission, AIModel, ChatHistory, UserProfile
-from .serializers import UserSerializer, FormSubmissionSerializer, AIModelSerializer, ChatHistorySerializer
-from .utils import generate_jwt_token, analyze_page_html, analyze_with_llm, get_ai_model_key, call_gemini_api, call_groq_api
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from .models import FormSubmission, ChatHistory, UserProfile
+from .ai_models import ai_models
+from .concurrency import llm_limiter
+from .profiles import profile_cache, profile_entry
+from .metrics import record_tokens
+from .conditional import make_etag, history_validators, not_modified, with_validators
+from .pages import resolve_page, UnknownPage, PageHashMismatch
+from .authentication import decode_token
+from .serializers import UserSerializer, FormSubmissionSerializer, AIModelSerializer
+from .utils import generate_jwt_token, generate_refresh_token, analyze_page_html, analyze_with_llm, get_ai_model_key, call_llm_coalesced
+from .prompts import build_chat_prompt
+from .summaries import conversation_summaries
+from .writebehind import write_behind
+from .streaming import wants_stream, sse_response, chat_event_stream, ndjson_response, analyze_field_stream
+import base64
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 import json
 from urllib.parse import urlparse
 
 User = get_user_model()
 
+MAX_HISTORY_PAGE_SIZE = 100
+
+
+def get_user_data(user):
+    """Basic user data merged with the custom profile fields"""
+    user_data = {
+        'email': user.email,
+        'name': f"{user.first_name} {user.last_name}".strip() or user.email,
+        'username': user.username,
+    }
+    user_data.update(profile_cache.get(user.id).data)  # Merge custom profile fields
+    return user_data
+
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
@@ -106,6 +137,7 @@ def social_login(request):
         
         return Response({
             'token': jwt_token,
+            'refresh_token': generate_refresh_token(user),
             'user': user_data,
         })
     
@@ -113,6 +145,30 @@ def social_login(request):
         return Response({'error': f'Authentication failed: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@api_view(['POST'])
+@authentication_classes([])  # The expired access token may still be sent along
+@permission_classes([AllowAny])
+def refresh_token(request):
+    """Exchange a refresh token for a new access token (and a rotated refresh token)"""
+    token = request.data.get('refresh_token')
+    if not token:
+        return Response({'error': 'refresh_token is required'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        payload = decode_token(token, token_type='refresh')
+    except AuthenticationFailed as e:
+        return Response({'error': str(e.detail)}, status=status.HTTP_401_UNAUTHORIZED)
+    
+    user = User.objects.filter(id=payload['user_id'], is_active=True).first()
+    if user is None:
+        return Response({'error': 'User inactive or deleted'}, status=status.HTTP_401_UNAUTHORIZED)
+    
+    return Response({
+        'token': generate_jwt_token(user),
+        'refresh_token': generate_refresh_token(user),
+    })
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def analyze_page(request):
@@ -144,55 +200,163 @@ def analyze_page(request):
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def analyze_with_ai(request):
-    """Analyze page HTML using LLM (Gemini or Groq) with chat history"""
+    """Analyze page HTML using LLM (Gemini or Groq) with chat history
+    
+    Instead of `html` the client may send `html_hash` (SHA-256 hex of the HTML)
+    of a page it uploaded before. Unknown hashes get 409 with upload_required,
+    and the client then resends the full HTML. With `stream` set the answer
+    comes back as NDJSON, one line per field (see api/streaming.py).
+    """
     html = request.data.get('html')
+    html_hash = request.data.get('html_hash')
     url = request.data.get('url')
     chat_history = request.data.get('chat_history', [])
     
-    if not html or not url:
+    if not (html or html_hash) or not url:
         return Response({'error': 'HTML and URL are required'}, status=status.HTTP_400_BAD_REQUEST)
     
+    try:
+        digest, descriptors = resolve_page(html, html_hash)
+    except PageHashMismatch as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except UnknownPage as e:
+        return Response({'error': str(e), 'upload_required': True}, status=status.HTTP_409_CONFLICT)
+    
     # Get user's preferred model
     model_name = request.user.preferred_ai_model or 'gemini'
     
-    # Prepare user data
-    user_data = {
-        'email': request.user.email,
-        'name': f"{request.user.first_name} {request.user.last_name}".strip() or request.user.email,
-        'username': request.user.username,
-    }
+    # Prepare user data (includes custom profile fields)
+    user_data = get_user_data(request.user)
     
-    # Get user profile data (custom fields)
-    try:
-        profile = UserProfile.objects.get(user=request.user)
-        user_data.update(profile.data)  # Merge custom profile fields
-    except UserProfile.DoesNotExist:
-        pass  # No custom profile data
+    # Stream each field as NDJSON the moment the model closes it, when asked to
+    if wants_stream(request) and model_name in ('gemini', 'groq'):
+        api_key = get_ai_model_key(model_name)
+        if not api_key:
+            return Response({'error': f'API key not configured for {model_name}'},
+                          status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return ndjson_response(analyze_field_stream(
+            request.user, descriptors, chat_history, user_data, model_name, api_key, url,
+            {'url': url, 'html_hash': digest},
+        ))
     
     try:
         # Analyze with LLM (includes profile data)
-        result = analyze_with_llm(html, chat_history, user_data, model_name)
+        result = analyze_with_llm(html, chat_history, user_data, model_name, descriptors=descriptors)
         
         # Save assistant message to chat history
         website = urlparse(url).netloc
-        ChatHistory.objects.create(
+        write_behind.add(ChatHistory(
             user=request.user,
             role='assistant',
             message=result.get('message', 'Analysis complete'),
             website=website,
             url=url,
-        )
+        ))
         
         return Response({
             'url': url,
             'fields': result.get('fields', []),
             'message': result.get('message', ''),
-            'model_used': model_name,
+            'model_used': result.get('model_used', model_name),
+            'prompt_tokens': result.get('prompt_tokens'),
+            'cached': result.get('cached', False),
+            'html_hash': digest,
         })
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+def _analyze_batch_item(user_id, item, chat_history, user_data, model_name):
+    """Analyze one batch item under the LLM concurrency limits, never raises"""
+    try:
+        with llm_limiter.slot(user_id):
+            return analyze_with_llm(item['html'], chat_history, user_data, model_name, descriptors=item['descriptors'])
+    except Exception as e:
+        return {'error': str(e)}
+    finally:
+        # Worker threads must not keep database connections open
+        connections.close_all()
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def analyze_batch(request):
+    """Analyze several pages or frames in one request, calling the LLM for them concurrently
+    
+    Body: {"items": [{"url", "html" or "html_hash"}, ...], "chat_history": [...]}.
+    Results come back in item order; a failed item carries an error instead of fields.
+    """
+    items = request.data.get('items')
+    chat_history = request.data.get('chat_history', [])
+    
+    if not isinstance(items, list) or not items:
+        return Response({'error': 'items must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(items) > settings.ANALYZE_BATCH_MAX_ITEMS:
+        return Response({'error': f'At most {settings.ANALYZE_BATCH_MAX_ITEMS} items per batch'},
+                      status=status.HTTP_400_BAD_REQUEST)
+    
+    model_name = request.user.preferred_ai_model or 'gemini'
+    user_data = get_user_data(request.user)
+    
+    # Resolve pages up front so only LLM calls run in the pool
+    results = [None] * len(items)
+    pending = []
+    for index, item in enumerate(items):
+        url = item.get('url') if isinstance(item, dict) else None
+        html = item.get('html') if isinstance(item, dict) else None
+        html_hash = item.get('html_hash') if isinstance(item, dict) else None
+        if not (html or html_hash) or not url:
+            results[index] = {'url': url, 'error': 'HTML and URL are required'}
+            continue
+        try:
+            digest, descriptors = resolve_page(html, html_hash)
+        except PageHashMismatch as e:
+            results[index] = {'url': url, 'error': str(e)}
+            continue
+        except UnknownPage as e:
+            results[index] = {'url': url, 'error': str(e), 'upload_required': True}
+            continue
+        pending.append((index, {'url': url, 'html': html, 'html_hash': digest, 'descriptors': descriptors}))
+    
+    if pending:
+        with ThreadPoolExecutor(max_workers=min(len(pending), settings.LLM_PER_USER_CONCURRENCY)) as pool:
+            # Each item runs in a copy of the request's context so its timings count for the request
+            futures = [
+                (index, item, pool.submit(contextvars.copy_context().run, _analyze_batch_item, request.user.id, item, chat_history, user_data, model_name))
+                for index, item in pending
+            ]
+            for index, item, future in futures:
+                result = future.result()
+                if 'error' in result:
+                    results[index] = {'url': item['url'], 'html_hash': item['html_hash'], 'error': result['error']}
+                else:
+                    results[index] = {
+                        'url': item['url'],
+                        'html_hash': item['html_hash'],
+                        'fields': result.get('fields', []),
+                        'message': result.get('message', ''),
+                        'cached': result.get('cached', False),
+                        'model_used': result.get('model_used', model_name),
+                        'prompt_tokens': result.get('prompt_tokens'),
+                    }
+    
+    # Save assistant messages of the successful items
+    for result in results:
+        if 'error' not in result:
+            write_behind.add(ChatHistory(
+                user=request.user,
+                role='assistant',
+                message=result.get('message') or 'Analysis complete',
+                website=urlparse(result['url']).netloc,
+                url=result['url'],
+            ))
+    
+    return Response({
+        'results': results,
+        'model_used': model_name,
+    })
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def fill_form(request):
@@ -204,7 +368,7 @@ def fill_form(request):
     if not website or not url or not fields:
         return Response({'error': 'Website, URL, and fields are required'}, status=status.HTTP_400_BAD_REQUEST)
     
-    # Create form submission record
+    # Create form submission record, written right away as the response carries its id
     submission = FormSubmission.objects.create(
         user=request.user,
         website=website,
@@ -216,31 +380,94 @@ def fill_form(request):
     return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
+def _encode_history_cursor(item):
+    """Opaque cursor pointing just past an item in (-created_at, -id) order"""
+    raw = f"{item['created_at'].isoformat()}|{item['id']}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def _decode_history_cursor(cursor):
+    raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+    created_at, item_id = raw.rsplit('|', 1)
+    created_at = parse_datetime(created_at)
+    if created_at is None:
+        raise ValueError('Invalid cursor')
+    return created_at, int(item_id)
+
+
+def _history_item(submission):
+    """Flatten the stored {'fields': [...]} JSON of a submission"""
+    if 'fields' in submission:
+        fields = submission['fields']
+        submission['fields'] = fields.get('fields', []) if isinstance(fields, dict) else []
+    return submission
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def history(request):
-    """Get form filling history for the authenticated user"""
+    """Get form filling history for the authenticated user, newest first, one page at a time"""
     user_id = request.query_params.get('user_id')
     
     # Ensure user can only access their own history
     if user_id and str(user_id) != str(request.user.id):
         return Response({'error': 'Unauthorized'}, status=status.HTTP_403_FORBIDDEN)
     
+    try:
+        limit = min(int(request.query_params.get('limit', settings.REST_FRAMEWORK['PAGE_SIZE'])), MAX_HISTORY_PAGE_SIZE)
+    except ValueError:
+        return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    if limit < 1:
+        return Response({'error': 'limit must be positive'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    # Summary mode leaves the (potentially large) fields JSON in the database
+    summary = request.query_params.get('summary') in ('1', 'true', 'True')
+    columns = ['id', 'website', 'url', 'created_at'] if summary else ['id', 'website', 'url', 'fields', 'created_at']
+    
     submissions = FormSubmission.objects.filter(user=request.user)
     
-    # Parse fields from JSON
-    results = []
-    for submission in submissions:
-        fields_data = submission.fields.get('fields', []) if isinstance(submission.fields, dict) else []
-        results.append({
-            'id': submission.id,
-            'website': submission.website,
-            'url': submission.url,
-            'fields': fields_data,
-            'created_at': submission.created_at,
-        })
+    # Unchanged history (no new or deleted submissions) is answered with a 304
+    validators = history_validators(request, submissions, FormSubmission)
+    if validators:
+        response = not_modified(request, *validators)
+        if response is not None:
+            return response
+    
+    # Keyset pagination: continue strictly after the last item of the previous page
+    cursor = request.query_params.get('cursor')
+    if cursor:
+        try:
+            created_at, last_id = _decode_history_cursor(cursor)
+        except (ValueError, UnicodeDecodeError):
+            return Response({'error': 'Invalid cursor'}, status=status.HTTP_400_BAD_REQUEST)
+        submissions = submissions.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=last_id)
+        )
+    
+    page = list(submissions.order_by('-created_at', '-id').values(*columns)[:limit + 1])
+    has_more = len(page) > limit
+    results = [_history_item(item) for item in page[:limit]]
     
-    return Response({'results': results})
+    response = Response({
+        'results': results,
+        'next_cursor': _encode_history_cursor(results[-1]) if has_more else None,
+    })
+    return with_validators(response, *validators) if validators else response
+
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def history_detail(request, submission_id):
+    """Get a single form submission with its fields"""
+    submission = (
+        FormSubmission.objects.filter(user=request.user, id=submission_id)
+        .values('id', 'website', 'url', 'fields', 'created_at')
+        .first()
+    )
+    if submission is None:
+        return Response({'error': 'Not found'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(_history_item(submission))
 
 
 @api_view(['GET', 'POST'])
@@ -249,12 +476,19 @@ def model_settings(request):
     """Get or update user's preferred AI model"""
     if request.method == 'GET':
         # Get available models
-        models = AIModel.objects.filter(is_active=True)
-        serializer = AIModelSerializer(models, many=True)
-        return Response({
+        # Validated against the in-memory model snapshot, without a query
+        active = ai_models.active_models()
+        etag = make_etag([(model.model_name, model.updated_at) for model in active], request.user.preferred_ai_model)
+        last_modified = max((model.updated_at for model in active), default=None)
+        response = not_modified(request, etag, last_modified)
+        if response is not None:
+            return response
+        
+        serializer = AIModelSerializer(active, many=True)
+        return with_validators(Response({
             'available_models': serializer.data,
             'current_model': request.user.preferred_ai_model,
-        })
+        }), etag, last_modified)
     
     elif request.method == 'POST':
         # Update user's preferred model
@@ -264,9 +498,7 @@ def model_settings(request):
                           status=status.HTTP_400_BAD_REQUEST)
         
         # Check if model is available
-        try:
-            ai_model = AIModel.objects.get(model_name=model_name, is_active=True)
-        except AIModel.DoesNotExist:
+        if ai_models.get_key(model_name) is None:
             return Response({'error': f'Model {model_name} is not configured or inactive'}, 
                           status=status.HTTP_400_BAD_REQUEST)
         
@@ -285,15 +517,10 @@ def model_settings(request):
 def profile(request):
     """Get or update user profile data (custom fields)"""
     if request.method == 'GET':
-        # Get user profile
-        try:
-            profile = UserProfile.objects.get(user=request.user)
-            return Response({
-                'data': profile.data,
-                'updated_at': profile.updated_at,
-            })
-        except UserProfile.DoesNotExist:
-            return Response({'data': {}, 'updated_at': None})
+        # Get user profile, or just confirm the client's copy is current
+        entry = profile_cache.get(request.user.id)
+        return not_modified(request, entry.etag, entry.updated_at) or with_validators(
+            Response({'data': entry.data, 'updated_at': entry.updated_at}), entry.etag, entry.updated_at)
     
     elif request.method == 'POST' or request.method == 'PUT':
         # Update or create user profile
@@ -306,11 +533,12 @@ def profile(request):
         profile.data = data
         profile.save()
         
-        return Response({
+        entry = profile_entry(profile)
+        return with_validators(Response({
             'message': 'Profile updated successfully',
             'data': profile.data,
             'updated_at': profile.updated_at,
-        })
+        }), entry.etag, entry.updated_at)
 
 
 @api_view(['POST', 'GET'])
@@ -327,16 +555,22 @@ def chat(request):
             return Response({'error': 'Message is required'}, status=status.HTTP_400_BAD_REQUEST)
         
         # Save user message to history
-        ChatHistory.objects.create(
+        write_behind.add(ChatHistory(
             user=request.user,
             role='user',
             message=message,
             website=website,
             url=url if url else None,
-        )
+        ))
         
-        # Get chat history for context
-        recent_chats = ChatHistory.objects.filter(user=request.user).order_by('-created_at')[:20]
+        # Get chat history for context, older messages reach the prompt through the rolling summary
+        summary, summarized_until = conversation_summaries.get(request.user.id)
+        max_turns = settings.PROMPT_BUDGETS['MAX_TURNS']
+        recent_chats = write_behind.with_pending(
+            ChatHistory, request.user.id,
+            ChatHistory.objects.filter(user=request.user, id__gt=summarized_until).order_by('-created_at')[:max_turns],
+            limit=max_turns,
+        )
         chat_history = [
             {'role': chat.role, 'message': chat.message}
             for chat in reversed(recent_chats)
@@ -351,55 +585,36 @@ def chat(request):
                           status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         
         # Get user profile data (custom fields)
-        user_data = {
-            'email': request.user.email,
-            'name': f"{request.user.first_name} {request.user.last_name}".strip() or request.user.email,
-            'username': request.user.username,
-        }
-        
-        try:
-            profile = UserProfile.objects.get(user=request.user)
-            user_data.update(profile.data)  # Merge custom profile fields
-        except UserProfile.DoesNotExist:
-            pass  # No custom profile data
+        user_data = get_user_data(request.user)
         
         # Prepare prompt for general chat
-        user_context = "User Information:\n"
-        for key, value in user_data.items():
-            user_context += f"- {key.replace('_', ' ').title()}: {value}\n"
+        prompt = build_chat_prompt(user_data, chat_history, message, summary=summary)
         
-        prompt = f"""You are a helpful AI assistant for a form filling Chrome extension. 
-You help users fill forms intelligently and answer questions about form filling.
-
-{user_context}
-
-Recent conversation:
-{chr(10).join([f"{msg['role'].capitalize()}: {msg['message']}" for msg in chat_history[-10:]])}
-
-User: {message}
-Assistant:"""
+        # Stream tokens as server-sent events when asked to
+        if wants_stream(request) and model_name in ('gemini', 'groq'):
+            return sse_response(chat_event_stream(request.user, model_name, prompt.text, api_key, website, url))
         
         try:
-            # Call appropriate API
-            if model_name == 'gemini':
-                response_text = call_gemini_api(prompt, api_key)
-            elif model_name == 'groq':
-                response_text = call_groq_api(prompt, api_key)
+            # Call appropriate API, sharing the call with identical concurrent requests
+            if model_name in ('gemini', 'groq'):
+                response_text, model_used = call_llm_coalesced(model_name, prompt.text)
+                record_tokens(prompt.tokens, response_text)
             else:
-                response_text = "I'm sorry, I don't understand."
+                response_text, model_used = "I'm sorry, I don't understand.", model_name
             
             # Save assistant response to history
-            ChatHistory.objects.create(
+            write_behind.add(ChatHistory(
                 user=request.user,
                 role='assistant',
                 message=response_text,
                 website=website,
                 url=url if url else None,
-            )
+            ))
             
             return Response({
                 'message': response_text,
-                'model_used': model_name,
+                'model_used': model_used,
+                'prompt_tokens': prompt.tokens,
             })
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -407,7 +622,20 @@ Assistant:"""
     elif request.method == 'GET':
         # Get chat history
         limit = int(request.query_params.get('limit', 50))
-        chats = ChatHistory.objects.filter(user=request.user).order_by('-created_at')[:limit]
-        serializer = ChatHistorySerializer(reversed(chats), many=True)
-        return Response({'history': serializer.data})
+        messages = ChatHistory.objects.filter(user=request.user)
+        validators = history_validators(request, messages, ChatHistory)
+        if validators:
+            response = not_modified(request, *validators)
+            if response is not None:
+                return response
+        
+        # Read-only rows go to the renderer as plain dicts, without a serializer
+        columns = ['id', 'role', 'message', 'website', 'url', 'created_at']
+        chats = write_behind.with_pending(
+            ChatHistory, request.user.id,
+            messages.order_by('-created_at').values(*columns)[:limit],
+            limit=limit, fields=columns,
+        )
+        response = Response({'history': chats[::-1]})
+        return with_validators(response, *validators) if validators else response
 
@@ -0,0 +1,205 @@
+"""
+Write-behind persistence for ChatHistory rows.
+
+Views hand new rows to `write_behind.add()` instead of saving them. A
+background thread inserts the buffered rows with `bulk_create`, in one
+transaction per flush, whenever `MAX_BATCH` rows are waiting or every
+`FLUSH_INTERVAL` seconds, and once more when the process exits. This keeps
+the request path free of write transactions, which on SQLite would
+otherwise queue up behind each other for the database write lock.
+
+Until a row is flushed it has no primary key and is only visible through
+`with_pending()`, which read paths use to merge a user's own pending rows
+into what they read from the database. Rows get their final `created_at`
+when they are flushed, at most `FLUSH_INTERVAL` seconds after they were
+queued. `bulk_create` does not send post_save, so the flush sends it for
+every row once they are inserted.
+
+When a batch fails, its rows are inserted one at a time so that one bad
+row does not hold back the others; a row that keeps failing is retried
+with the next flushes and dropped after MAX_ATTEMPTS, with an error logged.
+
+The buffer is per process: a user's pending rows are merged into reads
+served by the same process only. With several worker processes, a request
+routed to another process sees a new message once it is flushed, at most
+FLUSH_INTERVAL seconds later. Set WRITE_BEHIND_ENABLED=False where that is
+not acceptable.
+"""
+
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models.signals import post_save
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Flushes a row may fail before it is dropped
+MAX_ATTEMPTS = 3
+
+
+def _sent(obj):
+    """Tell post_save receivers about a row inserted by bulk_create"""
+    post_save.send(sender=type(obj), instance=obj, created=True, update_fields=None,
+                   raw=False, using=obj._state.db)
+
+
+def _reset(obj):
+    """Make a row whose insert was rolled back insertable again"""
+    obj.pk = None
+    obj._state.adding = True
+
+
+class WriteBehindQueue:
+    def __init__(self, enabled=True, max_batch=200, flush_interval=0.5):
+        self.enabled = enabled
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self._pending = []
+        self._flushing = []
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+
+    def _start(self):
+        self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def add(self, obj):
+        """Queue a new row for insertion and return it; it has no primary key until flushed"""
+        if not self.enabled or self._closed:
+            obj.save()
+            return obj
+        # Provisional timestamp so pending rows sort among saved ones
+        obj.created_at = timezone.now()
+        with self._condition:
+            if self._thread is None:
+                self._start()
+            self._pending.append(obj)
+            if len(self._pending) >= self.max_batch:
+                self._condition.notify()
+        return obj
+
+    async def aadd(self, obj):
+        """Async version of add"""
+        if not self.enabled or self._closed:
+            await obj.asave()
+            return obj
+        return self.add(obj)
+
+    def pending(self, model, user_id):
+        """A user's rows of a model not yet written, oldest first"""
+        with self._condition:
+            rows = self._flushing + self._pending
+        return [obj for obj in rows if type(obj) is model and obj.user_id == user_id]
+
+    def with_pending(self, model, user_id, rows, limit=None, fields=None):
+        """
+        Newest-first database rows with the user's pending rows merged in front.
+
+        rows are model instances, or dicts from .values(*fields) when fields
+        is given; pending rows are returned in the same shape. A queryset is
+        only evaluated after the pending rows are taken, so a row flushed in
+        between is read from the database rather than missed by both.
+        """
+        pending = self.pending(model, user_id)
+        return self._merge(pending, list(rows), limit, fields)
+
+    async def awith_pending(self, model, user_id, rows, limit=None, fields=None):
+        """Async version of with_pending, rows is a queryset"""
+        pending = self.pending(model, user_id)
+        return self._merge(pending, [row async for row in rows], limit, fields)
+
+    @staticmethod
+    def _merge(pending, rows, limit, fields):
+        saved_ids = {row['id'] if isinstance(row, dict) else row.pk for row in rows}
+        extra = [obj for obj in reversed(pending) if obj.pk is None or obj.pk not in saved_ids]
+        if fields is not None:
+            extra = [{field: getattr(obj, field) for field in fields} for obj in extra]
+        merged = extra + rows
+        return merged[:limit] if limit is not None else merged
+
+    def flush(self):
+        """Insert everything queued so far, returns the number of rows written"""
+        with self._flush_lock:
+            with self._condition:
+                batch, self._pending = self._pending, []
+                self._flushing = batch
+            if not batch:
+                return 0
+
+            try:
+                with transaction.atomic():
+                    by_model = {}
+                    for obj in batch:
+                        by_model.setdefault(type(obj), []).append(obj)
+                    for model, objs in by_model.items():
+                        model.objects.bulk_create(objs, batch_size=self.max_batch)
+                    for obj in batch:
+                        _sent(obj)
+                return len(batch)
+            except Exception:
+                for obj in batch:
+                    _reset(obj)
+                return self._flush_each(batch)
+            finally:
+                with self._condition:
+                    self._flushing = []
+
+    def _flush_each(self, batch):
+        """Insert rows one by one after their batch failed, requeueing the ones that fail"""
+        written, retry, error = 0, [], None
+        for obj in batch:
+            try:
+                with transaction.atomic():
+                    type(obj).objects.bulk_create([obj])
+                    _sent(obj)
+                written += 1
+            except Exception as e:
+                _reset(obj)
+                error = e
+                obj._write_attempts = getattr(obj, '_write_attempts', 0) + 1
+                if obj._write_attempts < MAX_ATTEMPTS:
+                    retry.append(obj)
+                else:
+                    logger.error('Dropping %s row of user %s after %d failed writes: %s',
+                                 type(obj).__name__, obj.user_id, obj._write_attempts, e)
+        if retry:
+            with self._condition:
+                self._pending = retry + self._pending
+        if error is not None:
+            raise error
+        return written
+
+    def _run(self):
+        while not self._closed:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: len(self._pending) >= self.max_batch or self._closed,
+                    timeout=self.flush_interval,
+                )
+            try:
+                self.flush()
+            except Exception:
+                # Start over with a fresh connection on the next round
+                connections.close_all()
+
+    def close(self):
+        """Flush what is left and write synchronously from now on"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self.flush()
+
+
+def build_write_behind(config):
+    """Build a WriteBehindQueue from a settings dict such as settings.WRITE_BEHIND"""
+    return WriteBehindQueue(**{key.lower(): value for key, value in config.items()})
+
+
+write_behind = build_write_behind(getattr(settings, 'WRITE_BEHIND', {}))
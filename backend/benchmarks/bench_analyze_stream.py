@@ -0,0 +1,74 @@
+"""
+Time to the first and to the last field of /api/analyze/ with and without
+NDJSON streaming, against a stub provider that generates tokens at a fixed
+rate.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_analyze_stream [--latency 0.3] [--fields 20] [--token-interval 0.005]
+"""
+
+import argparse
+import json
+import time
+
+from benchmarks.corpus import make_page
+from benchmarks.django_env import setup_django, create_fixtures, disable_analysis_cache
+from benchmarks.stub_provider import StubProvider
+
+
+def measure(client, token, html, stream):
+    """Return (ms to the first field, ms to all fields, fields received)"""
+    payload = {'html': html, 'url': 'https://example.com/apply', 'stream': stream}
+    start = time.perf_counter()
+    response = client.post('/api/analyze/', payload, content_type='application/json',
+                           headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 200, response.status_code
+    if not stream:
+        end = time.perf_counter()
+        fields = len(response.json()['fields'])
+        return (end - start) * 1000, (end - start) * 1000, fields
+
+    first = None
+    fields = 0
+    buffer = b''
+    for chunk in response.streaming_content:
+        buffer += chunk
+        while b'\n' in buffer:
+            line, buffer = buffer.split(b'\n', 1)
+            if json.loads(line)['type'] == 'field':
+                fields += 1
+                if first is None:
+                    first = time.perf_counter()
+    end = time.perf_counter()
+    return ((first or end) - start) * 1000, (end - start) * 1000, fields
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--latency', type=float, default=0.3)
+    parser.add_argument('--fields', type=int, default=20)
+    parser.add_argument('--tokens', type=int, default=50)
+    parser.add_argument('--token-interval', type=float, default=0.005)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    setup_django()
+    _, token = create_fixtures()
+    disable_analysis_cache()
+    StubProvider(latency=args.latency, tokens=args.tokens, token_interval=args.token_interval,
+                 fields=args.fields).install()
+
+    from django.test import Client
+    client = Client()
+    html = make_page(20 * 1024)
+
+    print(f"{'mode':>10} {'first field ms':>15} {'all fields ms':>14} {'fields':>7}")
+    for stream in (False, True):
+        samples = [measure(client, token, html, stream) for _ in range(args.repeat)]
+        first = sorted(s[0] for s in samples)[len(samples) // 2]
+        total = sorted(s[1] for s in samples)[len(samples) // 2]
+        print(f"{'stream' if stream else 'blocking':>10} {first:>15.1f} {total:>14.1f} {samples[0][2]:>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Load test of the sync and async LLM-bound endpoints against a stub provider.
+
+The sync endpoint is driven from a thread pool the size of a WSGI worker
+pool; the async endpoint is driven from a single event loop, as under ASGI.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_async [--latency 0.5] [--workers 4] [--concurrency 1 10 100 300]
+"""
+
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.django_env import setup_django, create_fixtures, disable_analysis_cache
+from benchmarks.stub_provider import StubProvider
+
+PAGE = '<form id="signup"><label for="e">Email</label><input id="e" name="email" type="email"><input name="phone" type="tel"></form>'
+
+
+def run_sync(path, payload, token, requests, workers):
+    """Send requests through the sync view with a fixed worker pool"""
+    from django.test import Client
+
+    def one(_):
+        response = Client().post(path, payload, content_type='application/json', headers={'Authorization': f'Bearer {token}'})
+        assert response.status_code == 200, response.content
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(one, range(requests)))
+    return time.perf_counter() - start
+
+
+def run_async(path, payload, token, requests, concurrency):
+    """Send requests through the async view from one event loop"""
+    from django.test import AsyncClient
+
+    async def main():
+        client = AsyncClient()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one():
+            async with semaphore:
+                response = await client.post(path, payload, content_type='application/json', headers={'Authorization': f'Bearer {token}'})
+                assert response.status_code == 200, response.content
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        return time.perf_counter() - start
+
+    return asyncio.run(main())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--latency', type=float, default=0.5, help='stub provider latency in seconds')
+    parser.add_argument('--workers', type=int, default=4, help='sync worker threads')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 10, 100, 300])
+    parser.add_argument('--endpoint', choices=['analyze', 'chat'], default='analyze')
+    args = parser.parse_args()
+
+    setup_django()
+    _, token = create_fixtures()
+    disable_analysis_cache()
+    StubProvider(latency=args.latency).install()
+
+    if args.endpoint == 'analyze':
+        payload = {'html': PAGE, 'url': 'https://example.com/signup'}
+    else:
+        payload = {'message': 'What can you fill here?', 'url': 'https://example.com/signup'}
+
+    print(f'stub latency {args.latency}s, sync workers {args.workers}, endpoint {args.endpoint}')
+    print(f"{'concurrency':>11} {'requests':>9} {'sync req/s':>11} {'async req/s':>12}")
+    for concurrency in args.concurrency:
+        requests = max(concurrency, 10)
+        sync_time = run_sync(f'/api/{args.endpoint}/', payload, token, requests, min(concurrency, args.workers))
+        async_time = run_async(f'/api/async/{args.endpoint}/', payload, token, requests, concurrency)
+        print(f'{concurrency:>11} {requests:>9} {requests / sync_time:>11.1f} {requests / async_time:>12.1f}')
+
+
+if __name__ == '__main__':
+    main()
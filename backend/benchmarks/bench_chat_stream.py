@@ -0,0 +1,57 @@
+"""
+Time-to-first-token of /api/chat/ with and without streaming, against a
+stub provider that generates tokens at a fixed rate.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_chat_stream [--latency 0.3] [--tokens 200] [--token-interval 0.01]
+"""
+
+import argparse
+import time
+
+from benchmarks.django_env import setup_django, create_fixtures
+from benchmarks.stub_provider import StubProvider
+
+
+def measure(client, token, stream):
+    """Return (time to first byte of the answer, total time) in ms"""
+    payload = {'message': 'Tell me about this form', 'url': 'https://example.com/', 'stream': stream}
+    start = time.perf_counter()
+    response = client.post('/api/chat/', payload, content_type='application/json', headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 200, response.status_code
+    if stream:
+        first = None
+        for _ in response.streaming_content:
+            if first is None:
+                first = time.perf_counter()
+    else:
+        first = time.perf_counter()
+    end = time.perf_counter()
+    return (first - start) * 1000, (end - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--latency', type=float, default=0.3)
+    parser.add_argument('--tokens', type=int, default=200)
+    parser.add_argument('--token-interval', type=float, default=0.01)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    setup_django()
+    _, token = create_fixtures()
+    StubProvider(latency=args.latency, tokens=args.tokens, token_interval=args.token_interval).install()
+
+    from django.test import Client
+    client = Client()
+
+    print(f"{'mode':>10} {'first token ms':>15} {'total ms':>10}")
+    for stream in (False, True):
+        samples = [measure(client, token, stream) for _ in range(args.repeat)]
+        ttft = sorted(s[0] for s in samples)[len(samples) // 2]
+        total = sorted(s[1] for s in samples)[len(samples) // 2]
+        print(f"{'stream' if stream else 'blocking':>10} {ttft:>15.1f} {total:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""
+Concurrent write throughput and lock waits of the database configurations.
+
+Each worker thread repeats the database part of a chat turn: insert the
+user's message, read the last 20 messages, insert the answer, each in its
+own autocommit transaction as the views did before write-behind. Reported
+per configuration and thread count: committed writes per second, p50/p99
+write latency (time spent waiting for the write lock shows up here) and
+writes that failed with "database is locked".
+
+SQLite configurations run against fresh temporary files. PostgreSQL runs
+with --postgres, against the database described by the DB_* environment
+variables (see fillora_backend/settings.py), and needs psycopg2.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_db_writes [--threads 1 4 16] [--turns 50] [--postgres]
+"""
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from benchmarks.bench_endpoints import percentile
+from benchmarks.django_env import setup_django, create_fixtures
+
+# name: SQLITE_PRAGMAS; Python's sqlite3 module itself waits up to 5s for locks
+SQLITE_CONFIGS = {
+    'sqlite default': {},
+    'sqlite wal, no busy_timeout': {'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'busy_timeout': 0},
+    'sqlite wal': {'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'busy_timeout': 5000},
+}
+
+
+def use_database(settings_dict, pragmas=None):
+    """Point the default connection at another database and migrate it"""
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.db import connections
+
+    connections.close_all()
+    default = settings.DATABASES['default']
+    default.clear()
+    default.update(settings_dict)
+    for key, value in (('ATOMIC_REQUESTS', False), ('AUTOCOMMIT', True), ('CONN_MAX_AGE', 0),
+                       ('CONN_HEALTH_CHECKS', False), ('OPTIONS', {}), ('TIME_ZONE', None),
+                       ('USER', ''), ('PASSWORD', ''), ('HOST', ''), ('PORT', ''), ('TEST', {})):
+        default.setdefault(key, value)
+    settings.SQLITE_PRAGMAS = pragmas or {}
+    call_command('migrate', verbosity=0)
+
+
+def run(user, threads, turns):
+    """Run the chat-turn workload, returns (seconds, write latencies, lock errors)"""
+    from django.db import connections, OperationalError
+    from api.models import ChatHistory
+
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    start_line = threading.Barrier(threads)
+
+    def worker():
+        local = []
+        failed = 0
+        start_line.wait()
+        try:
+            for turn in range(turns):
+                for role in ('user', 'assistant'):
+                    started = time.perf_counter()
+                    try:
+                        ChatHistory.objects.create(user=user, role=role, message=f'{role} message {turn}')
+                    except OperationalError:
+                        failed += 1
+                        continue
+                    local.append(time.perf_counter() - started)
+                    if role == 'user':
+                        list(ChatHistory.objects.filter(user=user).order_by('-created_at')[:20])
+        finally:
+            connections.close_all()
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    started = time.perf_counter()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return time.perf_counter() - started, latencies, errors[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--turns', type=int, default=50, help='chat turns per thread')
+    parser.add_argument('--postgres', action='store_true', help='also run against PostgreSQL (DB_* variables)')
+    args = parser.parse_args()
+
+    setup_django()
+
+    configs = []
+    for name, pragmas in SQLITE_CONFIGS.items():
+        fd, path = tempfile.mkstemp(prefix='fillora-bench-', suffix='.sqlite3')
+        os.close(fd)
+        configs.append((name, {'ENGINE': 'django.db.backends.sqlite3', 'NAME': path}, pragmas))
+    if args.postgres:
+        configs.append(('postgresql', {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('DB_NAME', 'fillora'),
+            'USER': os.getenv('DB_USER', 'fillora'),
+            'PASSWORD': os.getenv('DB_PASSWORD', ''),
+            'HOST': os.getenv('DB_HOST', 'localhost'),
+            'PORT': os.getenv('DB_PORT', '5432'),
+        }, None))
+
+    print(f'{args.turns} chat turns (2 writes, 1 read) per thread')
+    print(f"{'configuration':<30} {'threads':>7} {'writes/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'locked':>7}")
+    for name, settings_dict, pragmas in configs:
+        use_database(settings_dict, pragmas)
+        user, _ = create_fixtures()
+        for threads in args.threads:
+            seconds, latencies, errors = run(user, threads, args.turns)
+            p50 = percentile(latencies, 50) * 1000 if latencies else float('nan')
+            p99 = percentile(latencies, 99) * 1000 if latencies else float('nan')
+            print(f'{name:<30} {threads:>7} {len(latencies) / seconds:>9.0f} {p50:>8.2f} {p99:>8.2f} {errors:>7}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+Compare prompt size and preparation time of the form-distillation stage
+against the previous raw-HTML truncation in analyze_with_llm.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_distill [--repeat N]
+"""
+
+import argparse
+import time
+
+from api.distill import distill_forms, format_field_descriptors
+from benchmarks.corpus import corpus
+
+LEGACY_LIMIT = 50000
+
+
+def legacy_page_section(html):
+    """Page section of the prompt as built before distillation"""
+    return html[:LEGACY_LIMIT]
+
+
+def distilled_page_section(html):
+    """Page section of the prompt as built now"""
+    return format_field_descriptors(distill_forms(html))
+
+
+def timed(func, html, repeat):
+    """Return (result, best wall time in ms) over repeat runs"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(html)
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    header = f"{'page':>6} {'legacy bytes':>13} {'distilled bytes':>16} {'ratio':>7} {'legacy ms':>10} {'distill ms':>11} {'fields kept':>12}"
+    print(header)
+    print('-' * len(header))
+    for label, html in corpus().items():
+        legacy, legacy_ms = timed(legacy_page_section, html, args.repeat)
+        distilled, distill_ms = timed(distilled_page_section, html, args.repeat)
+        legacy_fields = len(distill_forms(legacy))
+        all_fields = len(distill_forms(html))
+        legacy_bytes = len(legacy.encode('utf-8'))
+        distilled_bytes = len(distilled.encode('utf-8'))
+        print(
+            f'{label:>6} {legacy_bytes:>13} {distilled_bytes:>16} '
+            f'{legacy_bytes / distilled_bytes:>6.1f}x {legacy_ms:>10.3f} {distill_ms:>11.3f} '
+            f'{legacy_fields:>5}/{all_fields:<6}'
+        )
+    print('\nLLM latency scales with prompt tokens (~4 bytes each); "fields kept" shows how many')
+    print('fields the legacy truncation still exposed to the model.')
+
+
+if __name__ == '__main__':
+    main()
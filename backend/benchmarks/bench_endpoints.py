@@ -0,0 +1,177 @@
+"""
+Latency benchmark for every route in api/urls.py, run in-process against a
+throwaway database and the stub LLM provider.
+
+For each endpoint (and each page size for the HTML-bearing ones) it reports
+p50/p95/p99 latency, database queries per request and peak Python memory
+of one request. Results can be saved as JSON and compared with an earlier
+run.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_endpoints [--iterations 20] [--latency 0.05] [--tokens 50]
+        [--sizes 5KB 50KB 500KB 5MB] [--output results.json] [--compare baseline.json]
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from benchmarks.corpus import SIZES, corpus
+from benchmarks.django_env import setup_django, create_fixtures, disable_analysis_cache
+from benchmarks.stub_provider import StubProvider
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def build_scenarios(user, pages):
+    """(name, method, path, payload) for every route; payload may be a callable"""
+    scenarios = [
+        ('social-login', 'post', '/api/social-login/', {
+            'access_token': 'stub',
+            'user_info': {'id': 'bench-google-id', 'email': user.email, 'name': 'Bench User'},
+        }),
+        ('fill-form', 'post', '/api/fill-form/', {
+            'website': 'example.com',
+            'url': 'https://example.com/signup',
+            'fields': [{'name': 'email', 'value': user.email, 'selector': '#email'}],
+        }),
+        ('history', 'get', '/api/history/', {}),
+        ('history-summary', 'get', '/api/history/', {'summary': '1'}),
+        ('model-get', 'get', '/api/model/', None),
+        ('model-post', 'post', '/api/model/', {'model_name': 'gemini'}),
+        ('chat-get', 'get', '/api/chat/', {'limit': 50}),
+        ('chat-post', 'post', '/api/chat/', {'message': 'What can you fill here?', 'url': 'https://example.com/signup'}),
+        ('profile-get', 'get', '/api/profile/', None),
+        ('profile-put', 'put', '/api/profile/', {'data': {'phone': '+1 555 0100', 'city': 'Springfield'}}),
+    ]
+    for label, html in pages.items():
+        scenarios.append((f'analyze-page[{label}]', 'post', '/api/analyze-page/', {'html': html, 'url': 'https://example.com/'}))
+        scenarios.append((f'analyze[{label}]', 'post', '/api/analyze/', {'html': html, 'url': 'https://example.com/'}))
+    return scenarios
+
+
+def send(client, token, method, path, payload):
+    headers = {'Authorization': f'Bearer {token}'}
+    if method == 'get':
+        return client.get(path, payload or {}, headers=headers)
+    return getattr(client, method)(path, json.dumps(payload), content_type='application/json', headers=headers)
+
+
+def run_scenario(client, token, scenario, iterations):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    name, method, path, payload = scenario
+    # Warm-up, also checks the endpoint works
+    response = send(client, token, method, path, payload)
+    if response.status_code >= 400:
+        raise RuntimeError(f'{name}: HTTP {response.status_code} {response.content[:200]!r}')
+
+    timings = []
+    queries = []
+    for _ in range(iterations):
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            send(client, token, method, path, payload)
+            timings.append((time.perf_counter() - start) * 1000)
+        queries.append(len(captured))
+
+    # Memory is measured separately, tracemalloc slows everything down
+    tracemalloc.start()
+    send(client, token, method, path, payload)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'name': name,
+        'iterations': iterations,
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'mean_ms': round(statistics.fmean(timings), 3),
+        'queries': round(statistics.fmean(queries), 2),
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+
+def print_results(results, baseline=None):
+    base = {row['name']: row for row in (baseline or {}).get('results', [])}
+    header = f"{'endpoint':<22} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'queries':>8} {'peak KB':>10}"
+    if base:
+        header += f" {'p50 vs base':>12}"
+    print(header)
+    print('-' * len(header))
+    for row in results:
+        line = (
+            f"{row['name']:<22} {row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f} {row['p99_ms']:>9.2f} "
+            f"{row['queries']:>8.1f} {row['peak_kb']:>10.1f}"
+        )
+        if row['name'] in base and base[row['name']]['p50_ms']:
+            change = (row['p50_ms'] / base[row['name']]['p50_ms'] - 1) * 100
+            line += f" {change:>+11.1f}%"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.05, help='stub provider latency in seconds')
+    parser.add_argument('--tokens', type=int, default=50, help='tokens per stub completion')
+    parser.add_argument('--token-interval', type=float, default=0.0)
+    parser.add_argument('--sizes', nargs='+', default=list(SIZES), choices=list(SIZES))
+    parser.add_argument('--with-cache', action='store_true', help='keep the analyze response cache enabled')
+    parser.add_argument('--only', nargs='+', help='run only endpoints whose name starts with one of these')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--compare', help='JSON results of an earlier run to compare against')
+    args = parser.parse_args()
+
+    setup_django()
+    user, token = create_fixtures()
+    if not args.with_cache:
+        disable_analysis_cache()
+    StubProvider(latency=args.latency, tokens=args.tokens, token_interval=args.token_interval).install()
+
+    from django.test import Client
+    client = Client()
+
+    pages = corpus({label: SIZES[label] for label in args.sizes})
+    scenarios = build_scenarios(user, pages)
+    if args.only:
+        scenarios = [s for s in scenarios if any(s[0].startswith(prefix) for prefix in args.only)]
+
+    results = [run_scenario(client, token, scenario, args.iterations) for scenario in scenarios]
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+
+    if args.output:
+        report = {
+            'meta': {
+                'timestamp': datetime.now(timezone.utc).isoformat(),
+                'python': platform.python_version(),
+                'iterations': args.iterations,
+                'stub_latency': args.latency,
+                'stub_tokens': args.tokens,
+                'analysis_cache': args.with_cache,
+            },
+            'results': results,
+        }
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'\nSaved results to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
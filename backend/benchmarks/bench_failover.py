@@ -0,0 +1,78 @@
+"""
+Tail latency and availability of LLM calls with provider failover, circuit
+breaking and hedging, using a separate stub for each provider.
+
+Gemini is the preferred provider and is made slow, flaky or down in turn;
+Groq stays healthy. Each scenario runs the same calls with the router's
+default settings, with hedging and without failover.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_failover [--calls 50] [--hedge-after 0.5] [--timeout 2]
+"""
+
+import argparse
+import time
+
+from benchmarks.bench_endpoints import percentile
+from benchmarks.django_env import setup_django, create_fixtures
+from benchmarks.stub_provider import StubProvider
+
+PROMPT = 'What can you fill here?'
+
+# name: (gemini stub options, groq stub options)
+SCENARIOS = {
+    'healthy': ({'latency': 0.1}, {'latency': 0.1}),
+    'slow tail (10% at 3s)': ({'latency': 0.1, 'slow_rate': 0.1, 'slow_latency': 3}, {'latency': 0.15}),
+    'flaky (30% errors)': ({'latency': 0.1, 'failure_rate': 0.3}, {'latency': 0.15}),
+    'outage (errors after 1s)': ({'latency': 1, 'failure_rate': 1.0}, {'latency': 0.15}),
+    'hung (never answers)': ({'latency': 60}, {'latency': 0.15}),
+}
+
+
+def run(calls, router_options):
+    """Send calls sequentially through a fresh router, returns (timings, errors)"""
+    from api import utils
+    from api.failover import build_router
+
+    utils.llm_router = build_router(router_options)
+    timings, errors = [], 0
+    for _ in range(calls):
+        start = time.perf_counter()
+        try:
+            utils.call_llm_routed('gemini', PROMPT)
+        except Exception:
+            errors += 1
+        timings.append(time.perf_counter() - start)
+    return timings, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--calls', type=int, default=50)
+    parser.add_argument('--hedge-after', type=float, default=0.5)
+    parser.add_argument('--timeout', type=float, default=2.0)
+    args = parser.parse_args()
+
+    setup_django()
+    create_fixtures()
+
+    breaker = {'MIN_CALLS': 5, 'OPEN_DURATION': 30, 'SLOW_CALL_DURATION': args.timeout}
+    configs = {
+        'no failover': {'TIMEOUT': args.timeout, 'FAILOVER': False, 'BREAKER': breaker},
+        'failover': {'TIMEOUT': args.timeout, 'BREAKER': breaker},
+        'failover+hedge': {'TIMEOUT': args.timeout, 'HEDGE_AFTER': args.hedge_after, 'BREAKER': breaker},
+    }
+
+    print(f'{args.calls} calls per run, timeout {args.timeout}s, hedge after {args.hedge_after}s')
+    print(f"{'scenario':<26} {'router':<15} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for name, (gemini, groq) in SCENARIOS.items():
+        StubProvider(tokens=1, **gemini).install(providers=['gemini'])
+        StubProvider(tokens=1, **groq).install(providers=['groq'])
+        for label, options in configs.items():
+            timings, errors = run(args.calls, options)
+            print(f'{name:<26} {label:<15} {percentile(timings, 50) * 1000:>8.0f} '
+                  f'{percentile(timings, 95) * 1000:>8.0f} {percentile(timings, 99) * 1000:>8.0f} {errors:>7}')
+
+
+if __name__ == '__main__':
+    main()
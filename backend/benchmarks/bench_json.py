@@ -0,0 +1,108 @@
+"""
+Compare DRF's stdlib-json parser and renderer against api.renderers, and
+the chat history serializer against the plain-dict path, on ~1 MB payloads.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_json [--size-kb 1024] [--repeat 5]
+"""
+
+import argparse
+import io
+import json
+import time
+import tracemalloc
+from datetime import timedelta
+
+from benchmarks.django_env import setup_django
+
+
+def measure(func, repeat):
+    """(best wall time in ms, peak traced KB, allocated blocks still held by the result)"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    result = func()
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, 'filename'))
+    del result
+    return best, peak / 1024, blocks
+
+
+def analyze_body(size):
+    """A /api/analyze/ request body carrying a page of about size bytes"""
+    from benchmarks.corpus import make_page
+    return {'url': 'https://example.com/apply', 'html': make_page(size), 'chat_history': []}
+
+
+def decoded(result):
+    """Rendered bytes parsed back, parsed data as is"""
+    return json.loads(result) if isinstance(result, bytes) else result
+
+
+def chat_rows(size):
+    """ChatHistory instances totalling about size bytes of message text"""
+    from django.utils import timezone
+    from api.models import ChatHistory
+    now = timezone.now()
+    text = 'Please fill in my details for the application — café, naïve, 東京. ' * 8
+    count = max(1, size // len(text))
+    return [
+        ChatHistory(id=i, user_id=1, role='user' if i % 2 else 'assistant', message=text,
+                    website='example.com', url='https://example.com/apply', created_at=now - timedelta(seconds=i))
+        for i in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size-kb', type=int, default=1024)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+    from rest_framework.parsers import JSONParser
+    from rest_framework.renderers import JSONRenderer
+    from api import renderers
+    from api.renderers import FastJSONParser, FastJSONRenderer
+    from api.serializers import ChatHistorySerializer
+
+    if renderers.orjson is None:
+        print('orjson is not installed: api.renderers falls back to the stdlib json module\n')
+
+    size = args.size_kb * 1024
+    body = JSONRenderer().render(analyze_body(size))
+    rows = chat_rows(size)
+    columns = ['id', 'role', 'message', 'website', 'url', 'created_at']
+    dicts = [{column: getattr(row, column) for column in columns} for row in rows]
+
+    cases = [
+        ('parse analyze body', 'DRF JSONParser', lambda: JSONParser().parse(io.BytesIO(body)),
+         'FastJSONParser', lambda: FastJSONParser().parse(io.BytesIO(body))),
+        ('render chat history', 'serializer + JSONRenderer',
+         lambda: JSONRenderer().render({'history': ChatHistorySerializer(rows, many=True).data}),
+         'dicts + FastJSONRenderer', lambda: FastJSONRenderer().render({'history': dicts})),
+    ]
+
+    print(f'payload: analyze body {len(body) / 1024:.0f} KB, chat history {len(rows)} messages '
+          f'({len(JSONRenderer().render({"history": ChatHistorySerializer(rows, many=True).data})) / 1024:.0f} KB)\n')
+    header = f"{'case':<20} {'path':<26} {'best ms':>9} {'peak KB':>9} {'blocks':>8}"
+    print(header)
+    print('-' * len(header))
+    for label, before_name, before, after_name, after in cases:
+        # Both paths must produce the same document
+        assert decoded(before()) == decoded(after()), f'{label}: outputs differ'
+        for name, func in ((before_name, before), (after_name, after)):
+            ms, peak, blocks = measure(func, args.repeat)
+            print(f'{label:<20} {name:<26} {ms:>9.2f} {peak:>9.0f} {blocks:>8}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""
+Compare the table-driven field matcher behind analyze_page_html with the
+previous BeautifulSoup + if/elif implementation on large HTML documents.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_matcher [--repeat N]
+"""
+
+import argparse
+import os
+import time
+
+from bs4 import BeautifulSoup
+
+from benchmarks.corpus import corpus
+
+USER_DATA = {
+    'email': 'bench@example.com',
+    'name': 'Bench User',
+    'username': 'bench',
+    'phone': '+1 555 0100',
+    'city': 'Springfield',
+    'zip': '12345',
+    'country': 'US',
+}
+
+
+# Previous implementation, kept verbatim as the baseline
+def legacy_analyze_page_html(html, user_data):
+    """Analyze HTML and extract form fields with suggested values (fallback method)"""
+    soup = BeautifulSoup(html, 'lxml')
+    fields = []
+    
+    # Find all input fields
+    inputs = soup.find_all(['input', 'textarea', 'select'])
+    
+    for input_elem in inputs:
+        field_name = input_elem.get('name') or input_elem.get('id', '')
+        field_type = input_elem.get('type', 'text').lower()
+        field_tag = input_elem.name.lower()
+        
+        if not field_name:
+            continue
+        
+        # Determine value based on field name/type
+        value = None
+        field_lower = field_name.lower()
+        
+        # Email fields
+        if 'email' in field_lower or field_type == 'email':
+            value = user_data.get('email', '')
+        
+        # Name fields
+        elif 'name' in field_lower or 'firstname' in field_lower or 'fname' in field_lower:
+            value = user_data.get('name', '').split()[0] if user_data.get('name') else ''
+        elif 'lastname' in field_lower or 'lname' in field_lower or 'surname' in field_lower:
+            name_parts = user_data.get('name', '').split()
+            value = name_parts[-1] if len(name_parts) > 1 else ''
+        elif 'fullname' in field_lower or 'full_name' in field_lower:
+            value = user_data.get('name', '')
+        
+        # Phone fields
+        elif 'phone' in field_lower or 'tel' in field_lower or field_type == 'tel':
+            value = user_data.get('phone', '')
+        
+        # Username fields
+        elif 'username' in field_lower or 'user' in field_lower:
+            value = user_data.get('username', '') or user_data.get('email', '').split('@')[0]
+        
+        # Address fields
+        elif 'address' in field_lower:
+            value = user_data.get('address', '')
+        
+        # City fields
+        elif 'city' in field_lower:
+            value = user_data.get('city', '')
+        
+        # State/Province fields
+        elif 'state' in field_lower or 'province' in field_lower:
+            value = user_data.get('state', '')
+        
+        # Zip/Postal code
+        elif 'zip' in field_lower or 'postal' in field_lower:
+            value = user_data.get('zip', '') or user_data.get('postal_code', '')
+        
+        # Country
+        elif 'country' in field_lower:
+            value = user_data.get('country', '')
+        
+        if value:
+            selector = f'[name="{field_name}"]' if field_name else None
+            fields.append({
+                'name': field_name,
+                'type': field_type,
+                'value': value,
+                'selector': selector,
+            })
+    
+    return fields
+
+
+
+def best_time(func, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'fillora_backend.settings')
+    import django
+    django.setup()
+    from api.utils import analyze_page_html
+
+    print(f"{'page':>6} {'legacy ms':>10} {'matcher ms':>11} {'speedup':>8} {'legacy fields':>14} {'matcher fields':>15}")
+    for label, html in corpus().items():
+        legacy, legacy_ms = best_time(lambda: legacy_analyze_page_html(html, USER_DATA), args.repeat)
+        current, current_ms = best_time(lambda: analyze_page_html(html, USER_DATA), args.repeat)
+        print(f'{label:>6} {legacy_ms:>10.2f} {current_ms:>11.2f} {legacy_ms / current_ms:>7.1f}x {len(legacy):>14} {len(current):>15}')
+
+
+if __name__ == '__main__':
+    main()
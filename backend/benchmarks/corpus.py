@@ -0,0 +1,88 @@
+"""
+Synthetic HTML pages for benchmarks.
+
+Pages look like real-world sign-up/checkout pages: a large amount of
+scripts, styles and navigation markup around a handful of forms.
+"""
+
+import random
+
+FIELD_SPECS = [
+    ('input', 'email', 'email', 'Email address', 'email'),
+    ('input', 'text', 'first_name', 'First name', 'given-name'),
+    ('input', 'text', 'last_name', 'Last name', 'family-name'),
+    ('input', 'tel', 'phone', 'Phone number', 'tel'),
+    ('input', 'text', 'username', 'Username', 'username'),
+    ('input', 'password', 'password', 'Password', 'new-password'),
+    ('input', 'text', 'address', 'Street address', 'street-address'),
+    ('input', 'text', 'city', 'City', 'address-level2'),
+    ('input', 'text', 'zip', 'ZIP / Postal code', 'postal-code'),
+    ('select', None, 'country', 'Country', 'country'),
+    ('textarea', None, 'comments', 'Comments', None),
+]
+
+COUNTRIES = ['US', 'IN', 'GB', 'DE', 'FR', 'JP', 'CA', 'AU']
+
+
+def _noise_block(rng, index):
+    """Script, style and navigation markup that surrounds real forms"""
+    words = ' '.join(rng.choice(['lorem', 'ipsum', 'dolor', 'sit', 'amet', 'consectetur']) for _ in range(40))
+    return (
+        f'<script>window.__STATE_{index}__ = {{"items": [{",".join(str(rng.randint(0, 10**6)) for _ in range(60))}]}};</script>\n'
+        f'<style>.c{index} {{ color: #{rng.randint(0, 0xFFFFFF):06x}; margin: {rng.randint(0, 40)}px; }}</style>\n'
+        f'<nav class="c{index}"><ul>' + ''.join(f'<li><a href="/p/{index}/{i}">{words[:30]}</a></li>' for i in range(8)) + '</ul></nav>\n'
+        f'<div class="c{index}"><p>{words}</p></div>\n'
+    )
+
+
+def _form(form_index):
+    """A form containing every field in FIELD_SPECS"""
+    parts = [f'<form id="form{form_index}" action="/submit/{form_index}" method="post">']
+    for tag, field_type, name, label, autocomplete in FIELD_SPECS:
+        field_id = f'{name}_{form_index}'
+        auto = f' autocomplete="{autocomplete}"' if autocomplete else ''
+        parts.append(f'<label for="{field_id}">{label}</label>')
+        if tag == 'input':
+            parts.append(f'<input type="{field_type}" id="{field_id}" name="{name}" placeholder="{label}"{auto} required>')
+        elif tag == 'select':
+            options = ''.join(f'<option value="{c}">{c}</option>' for c in COUNTRIES)
+            parts.append(f'<select id="{field_id}" name="{name}"{auto}>{options}</select>')
+        else:
+            parts.append(f'<textarea id="{field_id}" name="{name}"></textarea>')
+    parts.append('<input type="hidden" name="csrf" value="x"><button type="submit">Send</button></form>')
+    return '\n'.join(parts)
+
+
+def make_page(target_bytes, forms=2, seed=0):
+    """Build a page of roughly target_bytes with forms spread through it"""
+    rng = random.Random(seed)
+    head = '<!DOCTYPE html><html><head><title>Synthetic page</title></head><body>\n'
+    tail = '</body></html>'
+    blocks = []
+    size = len(head) + len(tail)
+    index = 0
+    while size < target_bytes:
+        block = _noise_block(rng, index)
+        blocks.append(block)
+        size += len(block)
+        index += 1
+
+    # Spread forms evenly, including past the old 50k truncation point
+    for i in range(forms):
+        position = (len(blocks) * (i + 1)) // (forms + 1)
+        blocks.insert(position, _form(i))
+    return head + ''.join(blocks) + tail
+
+
+SIZES = {
+    '5KB': 5 * 1024,
+    '50KB': 50 * 1024,
+    '500KB': 500 * 1024,
+    '5MB': 5 * 1024 * 1024,
+}
+
+
+def corpus(sizes=None):
+    """Return {label: html} for each benchmark page size"""
+    sizes = sizes or SIZES
+    return {label: make_page(size, seed=i) for i, (label, size) in enumerate(sizes.items())}
@@ -0,0 +1,55 @@
+"""
+Django setup for benchmarks: a throwaway SQLite database with a user and
+both AI models configured.
+"""
+
+import os
+import tempfile
+
+
+def setup_django(db_path=None):
+    """Configure Django against a fresh database, returns the database path"""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'fillora_backend.settings')
+
+    from django.conf import settings
+    if db_path is None:
+        fd, db_path = tempfile.mkstemp(prefix='fillora-bench-', suffix='.sqlite3')
+        os.close(fd)
+    settings.DATABASES['default']['NAME'] = db_path
+    settings.DEBUG = False
+
+    import django
+    django.setup()
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+    return db_path
+
+
+def create_fixtures(email='bench@example.com', profile_data=None):
+    """Create the benchmark user, its profile and the AI model rows; returns (user, token)"""
+    from django.contrib.auth import get_user_model
+    from api.models import AIModel, UserProfile
+    from api.utils import generate_jwt_token
+
+    User = get_user_model()
+    user, _ = User.objects.get_or_create(
+        email=email,
+        defaults={'username': email, 'first_name': 'Bench', 'last_name': 'User'},
+    )
+    UserProfile.objects.update_or_create(
+        user=user,
+        defaults={'data': profile_data or {'phone': '+1 555 0100', 'city': 'Springfield', 'zip': '12345'}},
+    )
+    for model_name in ('gemini', 'groq'):
+        AIModel.objects.update_or_create(
+            model_name=model_name,
+            defaults={'api_key': f'stub-{model_name}-key', 'is_active': True},
+        )
+    return user, generate_jwt_token(user)
+
+
+def disable_analysis_cache():
+    """Make every analyze call reach the provider"""
+    from api.cache import analysis_cache, InProcessBackend
+    analysis_cache.backend = InProcessBackend(max_entries=0)
@@ -0,0 +1,98 @@
+"""
+Local stand-in for the Gemini and Groq APIs.
+
+The stub replaces the provider call functions in api.utils and api.views
+with ones that wait a configurable latency and return a configurable number
+of tokens, so benchmarks exercise everything except the network call.
+Tokens are generated every `token_interval` seconds after an initial
+`latency`; streaming calls emit them as they are generated. Analyze prompts
+are answered with `fields` field objects ahead of the message.
+
+A stub can stand in for one provider only, so failover can be exercised
+with a slow or failing stub for one provider and a healthy one for the
+other:
+
+    StubProvider(latency=5).install(providers=['gemini'])
+    StubProvider(latency=0.2).install(providers=['groq'])
+"""
+
+import asyncio
+import json
+import random
+import time
+
+
+class StubProvider:
+    def __init__(self, latency=0.5, tokens=50, token_interval=0.01, failure_rate=0.0,
+                 slow_rate=0.0, slow_latency=None, fields=0):
+        self.latency = latency
+        self.fields = fields
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.tokens = tokens
+        self.token_interval = token_interval
+        self.failure_rate = failure_rate
+        self.calls = 0
+
+    def _response(self, prompt):
+        self.calls += 1
+        if self.failure_rate and random.random() < self.failure_rate:
+            raise Exception('Stub provider error')
+        words = ' '.join(f'tok{i}' for i in range(self.tokens))
+        if 'Return ONLY valid JSON' in prompt:
+            fields = [
+                {'name': f'field{i}', 'selector': f'#field{i}', 'value': f'value {i}', 'type': 'text'}
+                for i in range(self.fields)
+            ]
+            return json.dumps({'fields': fields, 'message': words})
+        return words
+
+    def _generation_time(self):
+        latency = self.latency
+        if self.slow_rate and random.random() < self.slow_rate:
+            # Occasional slow answers, as seen in a provider's tail latency
+            latency = self.slow_latency
+        return latency + self.token_interval * max(self.tokens - 1, 0)
+
+    def complete(self, prompt, api_key=None):
+        time.sleep(self._generation_time())
+        return self._response(prompt)
+
+    async def acomplete(self, prompt, api_key=None):
+        await asyncio.sleep(self._generation_time())
+        return self._response(prompt)
+
+    def _chunks(self, prompt):
+        """Chunks of the answer and the pause between them, spread over the generation time"""
+        words = self._response(prompt).split(' ')
+        interval = self.token_interval * max(self.tokens - 1, 0) / max(len(words) - 1, 1)
+        return [word + ' ' for word in words], interval
+
+    def stream(self, prompt, api_key=None):
+        time.sleep(self.latency)
+        chunks, interval = self._chunks(prompt)
+        for i, chunk in enumerate(chunks):
+            if i:
+                time.sleep(interval)
+            yield chunk
+
+    async def astream(self, prompt, api_key=None):
+        await asyncio.sleep(self.latency)
+        chunks, interval = self._chunks(prompt)
+        for i, chunk in enumerate(chunks):
+            if i:
+                await asyncio.sleep(interval)
+            yield chunk
+
+    def install(self, providers=('gemini', 'groq')):
+        """Route the provider calls in the api app for the given providers to this stub"""
+        from api import utils, views
+
+        for provider in providers:
+            for module in (utils, views):
+                if hasattr(module, f'call_{provider}_api'):
+                    setattr(module, f'call_{provider}_api', self.complete)
+            setattr(utils, f'acall_{provider}_api', self.acomplete)
+            setattr(utils, f'stream_{provider}_api', self.stream)
+            setattr(utils, f'astream_{provider}_api', self.astream)
+        return self
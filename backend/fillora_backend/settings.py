@@ -3,8 +3,10 @@ Django settings for fillora_backend project.
 """
 
 from pathlib import Path
+import json
 import os
 from dotenv import load_dotenv
+from corsheaders.defaults import default_headers
 
 load_dotenv()
 
@@ -39,9 +41,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    'api.middleware.RequestDecompressionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -73,11 +77,43 @@ WSGI_APPLICATION = 'fillora_backend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# SQLite by default; DB_ENGINE=postgresql for PostgreSQL (needs psycopg2)
+DB_ENGINE = os.getenv('DB_ENGINE', 'sqlite3')
+
+if DB_ENGINE in ('postgresql', 'postgres'):
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('DB_NAME', 'fillora'),
+            'USER': os.getenv('DB_USER', 'fillora'),
+            'PASSWORD': os.getenv('DB_PASSWORD', ''),
+            'HOST': os.getenv('DB_HOST', 'localhost'),
+            'PORT': os.getenv('DB_PORT', '5432'),
+            # Persistent connections, checked before they are reused after a request
+            'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '600')),
+            'CONN_HEALTH_CHECKS': True,
+            # Server-side cursors don't survive PgBouncer transaction pooling
+            'DISABLE_SERVER_SIDE_CURSORS': os.getenv('DB_PGBOUNCER', 'False') == 'True',
+            'OPTIONS': {
+                'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', '5')),
+            },
+        }
     }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv('DB_NAME', BASE_DIR / 'db.sqlite3'),
+        }
+    }
+
+# Applied to every new SQLite connection (api/db.py). WAL lets readers run next to
+# the single writer, and busy_timeout makes writers wait for the lock instead of
+# failing with "database is locked"
+SQLITE_PRAGMAS = {
+    'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', '5000')),  # milliseconds
 }
 
 
@@ -134,6 +170,16 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # orjson-backed when the optional orjson package is installed, stdlib json otherwise
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
 }
@@ -147,10 +193,135 @@ CORS_ALLOWED_ORIGINS = [
 
 CORS_ALLOW_CREDENTIALS = True
 
+# The extension uploads page HTML compressed
+CORS_ALLOW_HEADERS = list(default_headers) + ['content-encoding']
+
+# Upper bound for gzip/deflate/zstd request bodies once decompressed
+MAX_DECOMPRESSED_REQUEST_SIZE = int(os.getenv('MAX_DECOMPRESSED_REQUEST_SIZE', str(20 * 1024 * 1024)))
+
 # Google OAuth settings
 GOOGLE_CLIENT_ID = os.getenv('GOOGLE_CLIENT_ID', '')
 GOOGLE_CLIENT_SECRET = os.getenv('GOOGLE_CLIENT_SECRET', '')
 
 # JWT settings
 JWT_SECRET = os.getenv('JWT_SECRET', SECRET_KEY)
+JWT_ACCESS_TOKEN_LIFETIME = int(os.getenv('JWT_ACCESS_TOKEN_LIFETIME', str(60 * 60)))  # seconds
+JWT_REFRESH_TOKEN_LIFETIME = int(os.getenv('JWT_REFRESH_TOKEN_LIFETIME', str(30 * 24 * 60 * 60)))  # seconds
+JWT_USER_CACHE_TTL = int(os.getenv('JWT_USER_CACHE_TTL', '300'))  # seconds, never beyond token expiry
+# Seconds after which a cached user is checked against the row's updated_at and is_active,
+# so changes made in other processes are seen even with a per-process cache
+JWT_USER_CHECK_INTERVAL = float(os.getenv('JWT_USER_CHECK_INTERVAL', '5'))
+
+
+# Analyze response cache ('inprocess' or 'django' for the Django cache framework)
+ANALYZE_CACHE = {
+    'BACKEND': os.getenv('ANALYZE_CACHE_BACKEND', 'inprocess'),
+    'TTL': int(os.getenv('ANALYZE_CACHE_TTL', '3600')),
+}
+if ANALYZE_CACHE['BACKEND'] == 'inprocess':
+    ANALYZE_CACHE['MAX_ENTRIES'] = int(os.getenv('ANALYZE_CACHE_MAX_ENTRIES', '1024'))
+
+# How often (seconds) each process checks the AIModel table for changes (one aggregate query).
+AIMODEL_VERSION_CHECK_INTERVAL = float(os.getenv('AIMODEL_VERSION_CHECK_INTERVAL', '1.0'))
+
+# Extra heuristic field-matching rules for /api/analyze-page/: a JSON file with a
+# list of {"value", "patterns", "types", "autocomplete"} objects (see api/matcher.py)
+FIELD_MATCH_RULES_FILE = os.getenv('FIELD_MATCH_RULES_FILE', '')
+FIELD_MATCH_EXTRA_RULES = []
+if FIELD_MATCH_RULES_FILE:
+    with open(FIELD_MATCH_RULES_FILE) as rules_file:
+        FIELD_MATCH_EXTRA_RULES = json.load(rules_file)
+
+# Content-addressed store of analyzed pages, same options as ANALYZE_CACHE
+PAGE_STORE = {
+    'BACKEND': os.getenv('PAGE_STORE_BACKEND', 'inprocess'),
+    'TTL': int(os.getenv('PAGE_STORE_TTL', '3600')),
+}
+if PAGE_STORE['BACKEND'] == 'inprocess':
+    PAGE_STORE['MAX_ENTRIES'] = int(os.getenv('PAGE_STORE_MAX_ENTRIES', '2048'))
+
+# Concurrent LLM calls per process made by the batch analyze endpoint
+LLM_GLOBAL_CONCURRENCY = int(os.getenv('LLM_GLOBAL_CONCURRENCY', '32'))
+LLM_PER_USER_CONCURRENCY = int(os.getenv('LLM_PER_USER_CONCURRENCY', '4'))
+ANALYZE_BATCH_MAX_ITEMS = int(os.getenv('ANALYZE_BATCH_MAX_ITEMS', '20'))
+
+# Identical concurrent LLM calls share one provider call (api/singleflight.py).
+# Across processes this needs a shared CACHES backend (e.g. Redis or Memcached).
+LLM_SINGLE_FLIGHT = {
+    'CROSS_PROCESS': os.getenv('LLM_SINGLE_FLIGHT_CROSS_PROCESS', 'True') == 'True',
+    'LOCK_TIMEOUT': int(os.getenv('LLM_SINGLE_FLIGHT_LOCK_TIMEOUT', '60')),
+    'RESULT_TTL': int(os.getenv('LLM_SINGLE_FLIGHT_RESULT_TTL', '10')),
+}
+
+# Provider failover (api/failover.py): per-provider timeouts in seconds, e.g.
+# LLM_PROVIDER_TIMEOUTS='{"gemini": 20}', optional hedging after LLM_HEDGE_AFTER
+# seconds, and a circuit breaker over each provider's recent calls
+LLM_FAILOVER = {
+    'TIMEOUT': float(os.getenv('LLM_TIMEOUT', '30')),
+    'TIMEOUTS': json.loads(os.getenv('LLM_PROVIDER_TIMEOUTS', '{}')),
+    'HEDGE_AFTER': float(os.getenv('LLM_HEDGE_AFTER')) if os.getenv('LLM_HEDGE_AFTER') else None,
+    'FAILOVER': os.getenv('LLM_FAILOVER', 'True') == 'True',
+    'BREAKER': {
+        'WINDOW': int(os.getenv('LLM_BREAKER_WINDOW', '20')),
+        'MIN_CALLS': int(os.getenv('LLM_BREAKER_MIN_CALLS', '5')),
+        'FAILURE_RATE': float(os.getenv('LLM_BREAKER_FAILURE_RATE', '0.5')),
+        'SLOW_CALL_DURATION': float(os.getenv('LLM_BREAKER_SLOW_CALL_DURATION', '10')),
+        'SLOW_CALL_RATE': float(os.getenv('LLM_BREAKER_SLOW_CALL_RATE', '0.8')),
+        'OPEN_DURATION': float(os.getenv('LLM_BREAKER_OPEN_DURATION', '30')),
+    },
+}
+
+# Token budgets of the LLM prompts (api/prompts.py). Content goes in by priority:
+# instructions, profile, form fields, then the most recent turns
+PROMPT_BUDGETS = {
+    'ANALYZE': int(os.getenv('PROMPT_BUDGET_ANALYZE', '6000')),
+    'CHAT': int(os.getenv('PROMPT_BUDGET_CHAT', '3000')),
+    'MAX_TURNS': int(os.getenv('PROMPT_MAX_TURNS', '10')),
+    'MAX_MESSAGE_TOKENS': int(os.getenv('PROMPT_MAX_MESSAGE_TOKENS', '500')),
+    'SUMMARY': int(os.getenv('PROMPT_BUDGET_SUMMARY', '3000')),
+    'MAX_SUMMARY_TOKENS': int(os.getenv('PROMPT_MAX_SUMMARY_TOKENS', '400')),
+}
 
+# Rolling conversation summaries (api/summaries.py): chat prompts carry the summary
+# plus the messages after it; messages older than the last KEEP_TURNS are folded
+# into the summary in the background once MIN_NEW_MESSAGES of them have piled up
+CHAT_SUMMARY = {
+    'ENABLED': os.getenv('CHAT_SUMMARY_ENABLED', 'True') == 'True',
+    'KEEP_TURNS': int(os.getenv('CHAT_SUMMARY_KEEP_TURNS', '6')),
+    'MIN_NEW_MESSAGES': int(os.getenv('CHAT_SUMMARY_MIN_NEW_MESSAGES', '4')),
+}
+
+# Write-behind inserts of ChatHistory rows (api/writebehind.py):
+# buffered rows are written with bulk_create every FLUSH_INTERVAL seconds, as soon
+# as MAX_BATCH rows are waiting, and at shutdown
+WRITE_BEHIND = {
+    'ENABLED': os.getenv('WRITE_BEHIND_ENABLED', 'True') == 'True',
+    'MAX_BATCH': int(os.getenv('WRITE_BEHIND_MAX_BATCH', '200')),
+    'FLUSH_INTERVAL': float(os.getenv('WRITE_BEHIND_FLUSH_INTERVAL', '0.5')),
+}
+
+# History retention (api/management/commands/archive_history.py): rows older than
+# this many days are archived to gzipped monthly JSONL files under HISTORY_ARCHIVE_DIR
+# and deleted by `python manage.py archive_history`
+HISTORY_RETENTION_DAYS = {
+    'chat': int(os.getenv('CHAT_RETENTION_DAYS', '90')),
+    'submissions': int(os.getenv('SUBMISSION_RETENTION_DAYS', '365')),
+}
+HISTORY_ARCHIVE_DIR = os.getenv('HISTORY_ARCHIVE_DIR', str(BASE_DIR / 'archive'))
+
+# Cached UserProfile data (api/profiles.py), replaced whenever a profile is saved. With a
+# per-process cache, other processes see a save after at most CHECK_INTERVAL seconds,
+# when their copy is checked against the row's version; a shared CACHES backend
+# (e.g. Redis or Memcached) makes it immediate.
+PROFILE_CACHE = {
+    'TTL': int(os.getenv('PROFILE_CACHE_TTL', '300')),
+    'CHECK_INTERVAL': float(os.getenv('PROFILE_CACHE_CHECK_INTERVAL', '5')),
+}
+
+# Request timing and Prometheus metrics (api/metrics.py), served at /metrics to ALLOWED_IPS only.
+# SERVER_TIMING adds the per-phase breakdown of each request as a Server-Timing header.
+METRICS = {
+    'ENABLED': os.getenv('METRICS_ENABLED', 'True') == 'True',
+    'SERVER_TIMING': os.getenv('SERVER_TIMING', str(DEBUG)) == 'True',
+    'ALLOWED_IPS': [ip.strip() for ip in os.getenv('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',') if ip.strip()],
+}
@@ -24,15 +24,15 @@ function App() {
     });
   }, []);
 
-  const handleLogin = (userData, token) => {
-    chrome.storage.local.set({ user: userData, authToken: token }, () => {
+  const handleLogin = (userData, token, refreshToken) => {
+    chrome.storage.local.set({ user: userData, authToken: token, refreshToken }, () => {
       setUser(userData);
       setIsLoggedIn(true);
     });
   };
 
   const handleLogout = () => {
-    chrome.storage.local.remove(['authToken', 'user'], () => {
+    chrome.storage.local.remove(['authToken', 'refreshToken', 'user'], () => {
       setUser(null);
       setIsLoggedIn(false);
     });
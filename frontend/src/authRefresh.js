@@ -0,0 +1,52 @@
+import axios from 'axios';
+
+const API_BASE_URL = import.meta.env.VITE_API_BASE_URL || 'http://localhost:8000';
+
+let refreshPromise = null;
+
+const getStored = (keys) =>
+  new Promise((resolve) => chrome.storage.local.get(keys, resolve));
+
+const setStored = (items) =>
+  new Promise((resolve) => chrome.storage.local.set(items, resolve));
+
+// Exchange the stored refresh token for a new access token (one request at a time)
+const refreshAccessToken = () => {
+  if (!refreshPromise) {
+    refreshPromise = (async () => {
+      const { refreshToken } = await getStored(['refreshToken']);
+      if (!refreshToken) throw new Error('No refresh token');
+      const response = await axios.post(`${API_BASE_URL}/api/token/refresh/`, {
+        refresh_token: refreshToken,
+      });
+      await setStored({
+        authToken: response.data.token,
+        refreshToken: response.data.refresh_token,
+      });
+      return response.data.token;
+    })().finally(() => {
+      refreshPromise = null;
+    });
+  }
+  return refreshPromise;
+};
+
+// Retry requests that failed because the access token expired
+axios.interceptors.response.use(
+  (response) => response,
+  async (error) => {
+    const { config, response } = error;
+    const expired = response?.data?.detail === 'Token expired';
+    if (!expired || !config || config._retried) {
+      return Promise.reject(error);
+    }
+    try {
+      const token = await refreshAccessToken();
+      config._retried = true;
+      config.headers = { ...config.headers, Authorization: `Bearer ${token}` };
+      return axios(config);
+    } catch (_) {
+      return Promise.reject(error);
+    }
+  }
+);
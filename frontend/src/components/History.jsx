@@ -8,6 +8,8 @@ function History({ user }) {
   const [submissions, setSubmissions] = useState([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   useEffect(() => {
     loadHistory();
@@ -21,19 +23,25 @@ function History({ user }) {
     });
   };
 
+  const fetchPage = async (cursor) => {
+    const token = await getAuthToken();
+    const response = await axios.get(`${API_BASE_URL}/api/history/`, {
+      headers: {
+        Authorization: `Bearer ${token}`,
+      },
+      params: {
+        user_id: user.id,
+        ...(cursor ? { cursor } : {}),
+      },
+    });
+    setNextCursor(response.data.next_cursor || null);
+    return response.data.results || [];
+  };
+
   const loadHistory = async () => {
     try {
       setLoading(true);
-      const token = await getAuthToken();
-      const response = await axios.get(`${API_BASE_URL}/api/history/`, {
-        headers: {
-          Authorization: `Bearer ${token}`,
-        },
-        params: {
-          user_id: user.id,
-        },
-      });
-      setSubmissions(response.data.results || response.data || []);
+      setSubmissions(await fetchPage(null));
       setError(null);
     } catch (err) {
       console.error('Error loading history:', err);
@@ -43,6 +51,19 @@ function History({ user }) {
     }
   };
 
+  const loadMore = async () => {
+    if (!nextCursor) return;
+    try {
+      setLoadingMore(true);
+      const page = await fetchPage(nextCursor);
+      setSubmissions((prev) => [...prev, ...page]);
+    } catch (err) {
+      console.error('Error loading more history:', err);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const formatDate = (dateString) => {
     const date = new Date(dateString);
     return date.toLocaleString('en-US', {
@@ -151,6 +172,11 @@ function History({ user }) {
               </div>
             </div>
           ))}
+          {nextCursor && (
+            <button className="load-more-btn" onClick={loadMore} disabled={loadingMore}>
+              {loadingMore ? 'Loading...' : 'Load more'}
+            </button>
+          )}
         </div>
       )}
     </div>
@@ -137,7 +137,7 @@ function Login({ onLogin }) {
 
       if (response.data.token && response.data.user) {
         const userData = response.data.user;
-        onLogin(userData, response.data.token);
+        onLogin(userData, response.data.token, response.data.refresh_token);
       } else {
         setError('Login failed. Please try again.');
         setLoading(false);
@@ -10,6 +10,25 @@ if (typeof window !== 'undefined' && !window.SpeechRecognition && window.webkitS
   window.SpeechRecognition = window.webkitSpeechRecognition;
 }
 
+// Gzip a JSON payload; page HTML compresses ~10x. Falls back to plain JSON.
+const encodeJsonBody = async (payload) => {
+  const json = JSON.stringify(payload);
+  if (typeof CompressionStream === 'undefined') {
+    return { data: json, headers: {} };
+  }
+  const stream = new Blob([json]).stream().pipeThrough(new CompressionStream('gzip'));
+  const data = await new Response(stream).arrayBuffer();
+  return { data, headers: { 'Content-Encoding': 'gzip' } };
+};
+
+// SHA-256 hex digest of page HTML, the key of the backend's page store
+const sha256Hex = async (text) => {
+  const digest = await crypto.subtle.digest('SHA-256', new TextEncoder().encode(text));
+  return Array.from(new Uint8Array(digest))
+    .map((b) => b.toString(16).padStart(2, '0'))
+    .join('');
+};
+
 function VoiceAgent({ user }) {
   const [isListening, setIsListening] = useState(false);
   const [textInput, setTextInput] = useState('');
@@ -18,6 +37,7 @@ function VoiceAgent({ user }) {
   const [scraping, setScraping] = useState(false);
   const chatEndRef = useRef(null);
   const synthRef = useRef(null);
+  const uploadedPagesRef = useRef(new Set());
 
   const {
     transcript: liveTranscript,
@@ -197,17 +217,35 @@ function VoiceAgent({ user }) {
           }));
 
           // Send to backend for LLM analysis (includes profile data)
-          const response = await axios.post(
-            `${API_BASE_URL}/api/analyze/`,
-            {
+          const postAnalyze = async (payload) => {
+            const body = await encodeJsonBody({
               url: pageData.url,
-              html: pageData.html,
               chat_history: historyForLLM,
-            },
-            {
-              headers: { Authorization: `Bearer ${token}` },
+              ...payload,
+            });
+            return axios.post(`${API_BASE_URL}/api/analyze/`, body.data, {
+              headers: {
+                Authorization: `Bearer ${token}`,
+                'Content-Type': 'application/json',
+                ...body.headers,
+              },
+            });
+          };
+
+          // Pages uploaded earlier in this session are referenced by hash only
+          const htmlHash = await sha256Hex(pageData.html);
+          let response = null;
+          if (uploadedPagesRef.current.has(htmlHash)) {
+            try {
+              response = await postAnalyze({ html_hash: htmlHash });
+            } catch (err) {
+              if (!err.response?.data?.upload_required) throw err;
             }
-          );
+          }
+          if (!response) {
+            response = await postAnalyze({ html: pageData.html, html_hash: htmlHash });
+            uploadedPagesRef.current.add(htmlHash);
+          }
 
           if (response.data.fields && response.data.fields.length > 0) {
             const fieldsMsg = `Found ${response.data.fields.length} form fields:\n${response.data.fields.map(f => `- ${f.name}: ${f.value || 'N/A'}`).join('\n')}`;
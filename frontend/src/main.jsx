@@ -3,6 +3,7 @@ import React from "react";
 import ReactDOM from "react-dom/client";
 import App from "./App";
 import "./index.css";
+import "./authRefresh";
 
 // Error boundary component
 class ErrorBoundary extends React.Component {